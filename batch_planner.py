@@ -0,0 +1,148 @@
+import json
+from batch_submit import BatchResult
+from workflow import Workflow, node_signatures
+
+# model loads are what a cache miss really costs, sampling a few steps is cheap
+# in comparison. classes not listed here weigh 1
+LOADER_WEIGHT = 10
+
+def default_weight(class_type):
+    return LOADER_WEIGHT if "Loader" in (class_type or "") else 1
+
+# =======================================================================
+# what the planner needs from one variant: its node signatures (see
+# workflow.node_signatures) with class and depth, and a sort key.
+# variants can be workflow dicts, Workflows or encoded /prompt bodies
+class VariantGraph:
+    def __init__(self, variant, weight=default_weight):
+        if isinstance(variant, Workflow):
+            variant = variant.nodes
+        elif isinstance(variant, (bytes, bytearray, memoryview)):
+            variant = json.loads(bytes(variant))["prompt"]
+        self.signatures = node_signatures(variant)
+        self.signature_set = set(self.signatures.values())
+        self.weights = {node_id: weight(node.get("class_type")) for node_id, node in variant.items()}
+        self.classes = {node_id: node.get("class_type") for node_id, node in variant.items()}
+        depths = _depths(variant)
+        # upstream and heavy nodes first: variants that share a checkpoint sort
+        # next to each other, then those sharing a LoRA, conditioning text, ...
+        ordered = sorted(variant, key=lambda node_id: (depths[node_id], -self.weights[node_id], self.classes[node_id] or ""))
+        self.key = tuple(self.signatures[node_id] for node_id in ordered)
+
+    # cached nodes, cached weight and reloaded loaders when this graph runs right after `previous`
+    def cached_after(self, previous):
+        nodes = weight = reloads = 0
+        for node_id, signature in self.signatures.items():
+            if previous is not None and signature in previous.signature_set:
+                nodes += 1
+                weight += self.weights[node_id]
+            elif self.weights[node_id] >= LOADER_WEIGHT:
+                reloads += 1
+        return nodes, weight, reloads
+
+# number of links between a node and the graph's inputs.
+# iterative depth first pass (explicit stack), so the node order of a long
+# chain doesn't matter, see workflow.node_signatures
+def _depths(prompt_workflow):
+    depths = {}
+
+    def upstream(node_id):
+        return [str(value[0]) for value in prompt_workflow[node_id].get("inputs", {}).values()
+                if isinstance(value, list) and len(value) == 2 and str(value[0]) in prompt_workflow]
+
+    for root in prompt_workflow:
+        stack = [(root, False)]
+        while stack:
+            node_id, inputs_done = stack.pop()
+            if inputs_done:
+                depths[node_id] = 1 + max((depths[source] for source in upstream(node_id)), default=-1)
+            elif node_id not in depths:
+                depths[node_id] = 0  # guards against cycles in broken graphs
+                stack.append((node_id, True))
+                stack.extend((source, False) for source in upstream(node_id) if source not in depths)
+    return depths
+
+# predicted cache hit rate (share of nodes, and weighted by cost) and
+# loader reloads when the graphs run in this order
+def predict(graphs):
+    nodes = weight = reloads = total_nodes = total_weight = 0
+    previous = None
+    for graph in graphs:
+        n, w, r = graph.cached_after(previous)
+        nodes, weight, reloads = nodes + n, weight + w, reloads + r
+        total_nodes += len(graph.signatures)
+        total_weight += sum(graph.weights.values())
+        previous = graph
+    return {
+        "hit_rate": nodes / total_nodes if total_nodes else 0.0,
+        "weighted_hit_rate": weight / total_weight if total_weight else 0.0,
+        "reloads": reloads,
+    }
+
+# =======================================================================
+# reorders a batch so consecutive prompts share as much of ComfyUI's node
+# cache as possible (it keeps the outputs of the previous prompt, and a node
+# whose signature didn't change is reported in execution_cached instead of
+# running again). variants are grouped by their upstream subgraphs, heaviest
+# (model loaders) first, so a mixed-checkpoint batch loads every checkpoint
+# once instead of on every switch.
+#   plan = BatchPlan(variants)
+#   result = submit_batch(plan.variants, server_address, client_id)
+#   plan.track(result.prompt_ids); plan.attach(ws_client)
+#   ... plan.report() -> predicted vs observed hit rate
+class BatchPlan:
+    def __init__(self, variants, weight=default_weight):
+        variants = list(variants)
+        graphs = [VariantGraph(variant, weight) for variant in variants]
+        # stable sort, equal variants keep their submission order
+        self.order = sorted(range(len(variants)), key=lambda index: graphs[index].key)
+        self.variants = [variants[index] for index in self.order]
+        self.graphs = [graphs[index] for index in self.order]
+        self.baseline = predict(graphs)
+        self.predicted = predict(self.graphs)
+        self._sizes = {}  # prompt_id -> number of nodes
+        self._cached = {}  # prompt_id -> number of cached nodes
+
+    # a BatchResult of submitting plan.variants, mapped back to the order
+    # of the variants given to the plan
+    def restore(self, result):
+        prompt_ids = [None] * len(self.order)
+        for position, index in enumerate(self.order):
+            prompt_ids[index] = result.prompt_ids[position]
+        errors = {self.order[position]: e for position, e in result.errors.items()}
+        return BatchResult(prompt_ids, errors, result.latencies, result.elapsed)
+
+    # prompt_ids of the submitted (reordered) variants, in plan order
+    def track(self, prompt_ids):
+        for prompt_id, graph in zip(prompt_ids, self.graphs):
+            if prompt_id is not None:
+                self._sizes[prompt_id] = len(graph.signatures)
+
+    # prompts can start before track() was called, so every prompt is
+    # recorded and report() only looks at the tracked ones
+    def handle(self, message_type, data):
+        if message_type == "execution_cached" and data.get("prompt_id") is not None:
+            self._cached[data["prompt_id"]] = len(data.get("nodes", []))
+
+    def attach(self, ws_client):
+        async def on_cached(event):
+            self.handle(event.type, event.data)
+        ws_client.on("execution_cached", on_cached)
+        return self
+
+    # the observed rate is the share of nodes ComfyUI reported as cached,
+    # compare it with predicted_hit_rate
+    def report(self):
+        observed = [prompt_id for prompt_id in self._sizes if prompt_id in self._cached]
+        observed_nodes = sum(self._sizes[prompt_id] for prompt_id in observed)
+        return {
+            "variants": len(self.variants),
+            "baseline_hit_rate": self.baseline["hit_rate"],
+            "baseline_weighted_hit_rate": self.baseline["weighted_hit_rate"],
+            "baseline_reloads": self.baseline["reloads"],
+            "predicted_hit_rate": self.predicted["hit_rate"],
+            "predicted_weighted_hit_rate": self.predicted["weighted_hit_rate"],
+            "predicted_reloads": self.predicted["reloads"],
+            "observed_prompts": len(observed),
+            "observed_hit_rate": sum(self._cached[prompt_id] for prompt_id in observed) / observed_nodes if observed_nodes else None,
+        }
@@ -0,0 +1,113 @@
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_client, DEFAULT_MAX_CONNECTIONS
+
+# =======================================================================
+# result of a batch submission.
+# prompt_ids is in the same order as the input (None where the item failed),
+# errors maps input index -> exception for the items that failed.
+# total is the number of items, for results that don't keep the prompt_ids
+# (prompt_ids None). latencies may be a sample, they only feed percentiles
+class BatchResult:
+    def __init__(self, prompt_ids, errors, latencies, elapsed, total=None):
+        self.prompt_ids = prompt_ids
+        self.errors = errors
+        self.latencies = latencies
+        self.elapsed = elapsed
+        self.total = len(prompt_ids) if total is None else total
+
+    @property
+    def stats(self):
+        ordered = sorted(self.latencies)
+        submitted = self.total - len(self.errors)
+        return {
+            "total": self.total,
+            "submitted": submitted,
+            "failed": len(self.errors),
+            "elapsed_s": self.elapsed,
+            "submissions_per_sec": submitted / self.elapsed if self.elapsed > 0 else 0.0,
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+        }
+
+# =======================================================================
+# nearest-rank percentile of an already sorted list
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceiling division
+    return ordered[int(rank) - 1]
+
+# =======================================================================
+# a variant is either a workflow dict, or an already encoded /prompt
+# request body (bytes) e.g. from queue_loader.build_payload()
+def encode_variant(variant, client_id):
+    if isinstance(variant, (bytes, bytearray, memoryview)):
+        return bytes(variant)
+    request_payload = {"prompt": variant, "client_id": client_id}
+    return json.dumps(request_payload).encode('utf-8')
+
+def _submit_one(http, variant, client_id):
+    json_payload = encode_variant(variant, client_id)
+    start = time.perf_counter()
+    response = http.post_json('/prompt', json_payload).raise_for_status()
+    latency = time.perf_counter() - start
+    return response.json()['prompt_id'], latency
+
+# =======================================================================
+# submit many workflow variants to /prompt in parallel over a pool of
+# keep-alive connections (the shared client for server_address by default,
+# with a pool of its own when concurrency is above the default pool size).
+# at most `concurrency` requests are in flight, and the input iterable is
+# consumed lazily so very large batches are fine.
+# with metrics (a metrics.ComfyMetrics) every queued prompt is recorded, for
+# the submit latency and queue wait histograms
+def submit_batch(variants, server_address, client_id, concurrency=8, http=None, metrics=None):
+    if http is None:
+        if concurrency > DEFAULT_MAX_CONNECTIONS:
+            http = get_client(server_address, max_connections=concurrency)
+        else:
+            http = get_client(server_address)
+
+    return submit_windowed(variants, lambda variant: _submit_one(http, variant, client_id), concurrency, metrics)
+
+# the windowed submission behind submit_batch: submit(item) returns
+# (prompt_id, latency) and runs on up to `concurrency` threads, items are
+# taken from the iterable only as the window frees up
+def submit_windowed(items, submit, concurrency=8, metrics=None):
+    if metrics is not None:
+        submit_item = submit
+
+        # recorded on the worker, right when the server has queued it
+        def submit(item):
+            prompt_id, latency = submit_item(item)
+            metrics.submitted(prompt_id, latency)
+            return prompt_id, latency
+
+    prompt_ids = []
+    errors = {}
+    latencies = []
+    in_flight = deque()
+
+    def collect(index, future):
+        try:
+            prompt_id, latency = future.result()
+            prompt_ids[index] = prompt_id
+            latencies.append(latency)
+        except Exception as e:
+            errors[index] = e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, item in enumerate(items):
+            prompt_ids.append(None)
+            in_flight.append((index, executor.submit(submit, item)))
+            # keep a small window of pending futures instead of the whole batch
+            while len(in_flight) >= concurrency * 2:
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+
+    return BatchResult(prompt_ids, errors, latencies, time.perf_counter() - start)
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from terminalcolors import tcolor, color_text
+from fake_server import FakeComfyServer, DATA_DIR
+from http_client import get_client
+from batch_submit import submit_batch
+from workflow_template import WorkflowTemplate
+from history_store import HistoryStore
+import json_codec
+import queue_loader
+import uploads
+import ws_events
+
+# =======================================================================
+# benchmarks against the in-process fake server (fake_server.py), so they
+# run anywhere without a GPU. every benchmark returns
+# {name: (value, unit, higher_is_better)} and the results can be compared
+# with a saved baseline to catch regressions, e.g. in CI:
+#   python benchmark.py --save-baseline bench_baseline.json
+#   python benchmark.py --baseline bench_baseline.json --output bench_output.txt
+
+def _load_workflow():
+    with open('workflow_api.json', 'r') as file:
+        return json.load(file)
+
+# a big graph (like our 300+ node workflows) made from copies of workflow_api.json
+def _large_workflow(copies=30):
+    base = _load_workflow()
+    workflow = {}
+    for n in range(copies):
+        for node_id, node in base.items():
+            node = copy.deepcopy(node)
+            for name, value in node["inputs"].items():
+                if isinstance(value, list):
+                    node["inputs"][name] = [f"{value[0]}_{n}", value[1]]
+            if n:
+                node["_meta"]["title"] = f'{node["_meta"]["title"]} {n}'
+            workflow[f"{node_id}_{n}"] = node
+    return workflow
+
+# =======================================================================
+def bench_serialization(count):
+    workflow = _large_workflow()
+    slots = {"text": ("Pos Prompt", "text"), "seed": ("KSampler", "seed")}
+
+    start = time.perf_counter()
+    for i in range(count):
+        workflow["6_0"]["inputs"]["text"] = f"prompt {i}"
+        workflow["3_0"]["inputs"]["seed"] = i
+        queue_loader.build_payload(workflow, "client")
+    dumps = (time.perf_counter() - start) / count
+
+    template = WorkflowTemplate(workflow, slots)
+    start = time.perf_counter()
+    for i in range(count):
+        template.render("client", text=f"prompt {i}", seed=i)
+    render = (time.perf_counter() - start) / count
+
+    return {
+        f"serialize_json_dumps_{len(workflow)}_nodes_us": (dumps * 1e6, "us", False),
+        f"serialize_template_{len(workflow)}_nodes_us": (render * 1e6, "us", False),
+    }
+
+def bench_submit(server, count, concurrency):
+    workflow = _load_workflow()
+    payloads = [queue_loader.build_payload(workflow, "bench") for _ in range(count)]
+
+    start = time.perf_counter()
+    for payload in payloads:
+        get_client(server.server_address).post_json('/prompt', payload).raise_for_status()
+    sequential = count / (time.perf_counter() - start)
+
+    result = submit_batch(payloads, server.server_address, "bench", concurrency=concurrency)
+    stats = result.stats
+    return {
+        "submit_sequential_per_s": (sequential, "/s", True),
+        "submit_batch_per_s": (stats["submissions_per_sec"], "/s", True),
+        "submit_batch_p50_ms": (stats["p50_ms"], "ms", False),
+        "submit_batch_p99_ms": (stats["p99_ms"], "ms", False),
+    }
+
+def bench_events(server, prompts):
+    workflow = _load_workflow()
+
+    async def run():
+        ws_client = ws_events.EventClient(server.server_address, "bench-events")
+        dispatch_time = 0.0
+        received = 0
+
+        async def count(event):
+            nonlocal received
+            received += 1
+        ws_client.on("*", count)
+
+        # time spent decoding + dispatching, measured around dispatch()
+        original_dispatch = ws_client.dispatch
+
+        async def timed_dispatch(event):
+            nonlocal dispatch_time
+            start = time.perf_counter()
+            await original_dispatch(event)
+            dispatch_time += time.perf_counter() - start
+        ws_client.dispatch = timed_dispatch
+
+        await ws_client.connect()
+        task = asyncio.create_task(ws_client.run())
+        start = time.perf_counter()
+        prompt_ids = []
+        for _ in range(prompts):
+            prompt_id, _ = server.queue_prompt(copy.deepcopy(workflow), "bench-events")
+            prompt_ids.append(prompt_id)
+        await ws_client.wait_for(prompt_ids[-1])
+        elapsed = time.perf_counter() - start
+        await ws_client.close()
+        await task
+        return received, elapsed, dispatch_time
+
+    received, elapsed, dispatch_time = asyncio.run(run())
+    return {
+        "events_per_s": (received / elapsed, "/s", True),
+        "event_dispatch_us": (dispatch_time / max(received, 1) * 1e6, "us", False),
+    }
+
+def bench_history(server, count):
+    with open(os.path.join(DATA_DIR, 'get_history.json'), 'r') as file:
+        server.load_history(json.load(file))
+    http = get_client(server.server_address)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        http.get_json('/history')
+    full_fetch = (time.perf_counter() - start) / count
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = HistoryStore(server.server_address, os.path.join(folder, 'history.sqlite3'))
+        store.sync()
+        start = time.perf_counter()
+        for _ in range(count):
+            store.outputs(node_class="SaveImage")
+        local_query = (time.perf_counter() - start) / count
+        store.close()
+
+    return {
+        "history_full_fetch_ms": (full_fetch * 1000, "ms", False),
+        "history_local_query_ms": (local_query * 1000, "ms", False),
+    }
+
+def bench_upload(server, count, size):
+    data = os.urandom(size)
+    start = time.perf_counter()
+    for i in range(count):
+        uploads.upload_file(server.server_address, data, filename=f"bench_{i}.png")
+    elapsed = time.perf_counter() - start
+    return {"upload_mb_per_s": (count * size / elapsed / 1e6, "MB/s", True)}
+
+# parsing the sample responses in data/: the old json.loads(body.decode())
+# (raw bytes, str and tree in memory together), json_codec.loads (faster
+# backend when installed) and json_codec.iter_object keeping only the output
+# filenames of /history / the input names of /object_info.
+# peak_mb is the tracemalloc peak while parsing, body included
+JSON_SAMPLES = {
+    "history": ("get_history.json", "outputs.*.images.*.filename"),
+    "object_info": ("get_object_info.json", "input.required"),
+}
+
+def _measure(fn, count):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count, peak
+
+def bench_json(count):
+    results = {}
+    for name, (filename, field) in JSON_SAMPLES.items():
+        path = os.path.join(DATA_DIR, filename)
+        size = os.path.getsize(path)
+
+        def stdlib():
+            with open(path, 'rb') as file:
+                return json.loads(file.read().decode('utf-8'))
+
+        def codec():
+            with open(path, 'rb') as file:
+                return json_codec.loads(file.read())
+
+        def streamed():
+            with open(path, 'rb') as file:
+                return [fields for _, fields in json_codec.iter_fields(file, [field])]
+
+        for variant, fn in (("stdlib", stdlib), ("codec", codec), ("stream", streamed)):
+            elapsed, peak = _measure(fn, count)
+            results[f"json_{name}_{variant}_mb_per_s"] = (size / elapsed / 1e6, "MB/s", True)
+            results[f"json_{name}_{variant}_peak_mb"] = (peak / 1e6, "MB", False)
+    return results
+
+# cold start import time of the entry points, from `python -X importtime`.
+# submission, queue and history must not pull in the imaging, keyboard or
+# progress bar dependencies, those are counted in startup_heavy_imports
+STARTUP_MODULES = ("queue_loader", "comfy_api", "cli", "ws_ops_menu")
+HEAVY_MODULES = ("PIL", "pynput", "tqdm", "websocket")
+
+def _import_time(module):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stderr
+    # "import time: self [us] | cumulative | imported package"
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f"no importtime line for {module}")
+
+def bench_startup(runs):
+    results = {}
+    for module in STARTUP_MODULES:
+        best = min(_import_time(module) for _ in range(runs))
+        results[f"startup_import_{module}_ms"] = (best * 1000, "ms", False)
+
+    code = (f"import sys, {', '.join(STARTUP_MODULES)}; "
+            f"print(sum(1 for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    heavy = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    results["startup_heavy_imports"] = (int(heavy), "modules", False)
+    return results
+
+# =======================================================================
+def run_all(quick=False):
+    scale = 1 if quick else 5
+    results = {}
+    results.update(bench_startup(3 * scale))
+    results.update(bench_serialization(200 * scale))
+    results.update(bench_json(10 * scale))
+    with FakeComfyServer(max_steps=20) as server:
+        results.update(bench_submit(server, 100 * scale, concurrency=8))
+    with FakeComfyServer(max_steps=50, preview_every=10) as server:
+        results.update(bench_events(server, 5 * scale))
+    with FakeComfyServer() as server:
+        results.update(bench_history(server, 5 * scale))
+    with FakeComfyServer() as server:
+        results.update(bench_upload(server, 5 * scale, 4 * 1024 * 1024))
+    return results
+
+# flag every result that is worse than the baseline by more than threshold
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, (value, unit, higher_is_better) in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name][0]
+        if old == 0:
+            # e.g. startup_heavy_imports, anything above zero is a regression
+            if value > 0 and not higher_is_better:
+                regressions.append((name, old, value, float('inf')))
+            continue
+        change = (value - old) / old
+        if (change < -threshold) if higher_is_better else (change > threshold):
+            regressions.append((name, old, value, change))
+    return regressions
+
+def report(results, regressions):
+    lines = []
+    for name, (value, unit, _) in results.items():
+        lines.append(f"{name:<45} {value:>12.2f} {unit}")
+    if regressions:
+        lines.append("")
+        lines.append("REGRESSIONS:")
+        for name, old, value, change in regressions:
+            lines.append(f"{name:<45} {old:>12.2f} -> {value:.2f} ({change:+.0%})")
+    return "\n".join(lines)
+
+# =======================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks against a fake ComfyUI server")
+    parser.add_argument('--quick', action='store_true', help="smaller runs, for CI smoke checks")
+    parser.add_argument('--baseline', help="compare against this baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    parser.add_argument('--save-baseline', help="write the results as a new baseline JSON")
+    parser.add_argument('--output', help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    results = run_all(quick=args.quick)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+    text = report(results, regressions)
+    print(color_text(text, tcolor.RED if regressions else tcolor.GREEN))
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import sys
+import uuid
+import comfy_api
+import maintenance
+from batch_submit import submit_batch
+from history_store import HistoryStore
+from node_resolver import get_resolver, node_classes
+from schema_registry import get_registry
+from workflow import Workflow
+
+# =======================================================================
+# headless command line for the ComfyUI API, for cron jobs and workers.
+# every command prints JSON to stdout (one document, or JSON lines for
+# watch), errors go to stderr and the exit status is 1 if anything failed.
+# commands that take ids/files read them from stdin when given "-", e.g.
+#   python cli.py --server 192.168.0.37:8188 queue
+#   python cli.py history --max-items 10 --summary
+#   python cli.py delete 3c9a... 51f0...
+#   python cli.py history --summary | jq -r '.[].files.output[]' | python cli.py view - --out renders
+#   python cli.py submit workflow_api.json --set KSampler.seed=42 --count 4 --wait
+#   python cli.py prune --keep 500 --archive history.sqlite3
+DEFAULT_SERVER = os.environ.get('COMFYUI_SERVER', '127.0.0.1:8188')
+
+def _items(values):
+    if values == ['-']:
+        return [line.strip() for line in sys.stdin if line.strip()]
+    return values
+
+# exceptions in batch results become {"error": "..."}
+def _jsonable(result):
+    if isinstance(result, Exception):
+        return {"error": f"{type(result).__name__}: {result}"}
+    if isinstance(result, dict):
+        return {key: _jsonable(value) for key, value in result.items()}
+    return result
+
+def _failed(result):
+    if not isinstance(result, dict):
+        return False
+    return bool(result.get("errors")) or any(isinstance(value, Exception) for value in result.values())
+
+# "Title.input=value", value parsed as JSON when possible (numbers, true, ...)
+def _parse_set(assignment):
+    target, _, value = assignment.partition('=')
+    node_ref, _, input_name = target.rpartition('.')
+    if not node_ref or not input_name:
+        raise argparse.ArgumentTypeError(f"expected NODE.INPUT=VALUE, got '{assignment}'")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return node_ref, input_name, value
+
+# =======================================================================
+def cmd_stats(args):
+    return comfy_api.system_stats(args.server)
+
+def cmd_queue(args):
+    return comfy_api.queue(args.server)
+
+def cmd_prompt(args):
+    return comfy_api.prompt_status(args.server)
+
+def cmd_embeddings(args):
+    return comfy_api.embeddings(args.server)
+
+def cmd_extensions(args):
+    return comfy_api.extensions(args.server)
+
+def cmd_object_info(args):
+    if not args.node_class:
+        return comfy_api.object_info(args.server)
+    info = {}
+    for node_class in _items(args.node_class):
+        info.update(comfy_api.object_info(args.server, node_class))
+    return info
+
+def cmd_clear(args):
+    comfy_api.clear_queue(args.server)
+    return {"cleared": True}
+
+def cmd_interrupt(args):
+    comfy_api.interrupt(args.server)
+    return {"interrupted": True}
+
+def cmd_delete(args):
+    prompt_ids = _items(args.prompt_ids)
+    if args.queue_number:
+        prompt_ids += comfy_api.prompt_ids_for_queue_numbers(args.server, args.queue_number)
+    comfy_api.delete_queue_items(args.server, prompt_ids)
+    return {"deleted": prompt_ids}
+
+def cmd_history(args):
+    if args.prompt_ids:
+        history = {}
+        for prompt_id in _items(args.prompt_ids):
+            history.update(comfy_api.history(args.server, prompt_id))
+    elif args.summary:
+        return list(comfy_api.iter_history_summaries(args.server, args.max_items))
+    else:
+        history = comfy_api.history(args.server, max_items=args.max_items)
+    if args.summary:
+        return [comfy_api.history_summary(prompt_id, entry) for prompt_id, entry in history.items()]
+    return history
+
+def cmd_view(args):
+    return comfy_api.download_many(args.server, _items(args.filenames), args.out, image_type=args.type,
+                                   subfolder=args.subfolder, workers=args.workers)
+
+def cmd_upload(args):
+    original_ref = None
+    if args.original:
+        original_ref = {"filename": args.original, "subfolder": args.original_subfolder or "", "type": "input"}
+    return comfy_api.upload_many(args.server, _items(args.paths), subfolder=args.subfolder, overwrite=args.overwrite,
+                                 original_ref=original_ref, mask=args.mask, workers=args.workers)
+
+def cmd_submit(args):
+    workflow = Workflow.load(args.workflow)
+    for node_ref, input_name, value in args.set:
+        workflow.node_by_id(workflow.find_id(node_ref))["inputs"][input_name] = value
+    if args.validate:
+        get_registry(args.server).check(workflow)
+
+    result = submit_batch([workflow.nodes] * args.count, args.server, args.client_id, concurrency=args.concurrency)
+    classes = node_classes(workflow.nodes)
+    for prompt_id in result.prompt_ids:
+        if prompt_id is not None:
+            get_resolver(args.server).register(prompt_id, classes)
+    output = {
+        "client_id": args.client_id,
+        "prompt_ids": result.prompt_ids,
+        "errors": {str(index): str(e) for index, e in result.errors.items()},
+        "stats": result.stats,
+    }
+    submitted = [prompt_id for prompt_id in result.prompt_ids if prompt_id is not None]
+    if args.wait and submitted:
+        import asyncio
+
+        async def wait():
+            async for _ in comfy_api.watch(args.server, args.client_id, submitted):
+                pass
+        asyncio.run(wait())
+        history = {}
+        for prompt_id in submitted:
+            history.update(comfy_api.history(args.server, prompt_id))
+        output["outputs"] = [comfy_api.history_summary(prompt_id, entry) for prompt_id, entry in history.items()]
+    return output
+
+# predicate from --client-id / --status / --older-than. selecting everything
+# takes an explicit --all, a forgotten filter must not wipe the server
+def _selection(args):
+    predicates = []
+    if args.client_id:
+        predicates.append(maintenance.by_client(*args.client_id))
+    if args.status:
+        predicates.append(maintenance.with_status(*args.status))
+    if getattr(args, 'older_than', None) is not None:
+        predicates.append(maintenance.older_than(args.older_than))
+    if not predicates and not args.all:
+        raise ValueError(f"'{args.command}' without a filter selects every prompt, pass --all to confirm")
+    if predicates and args.all:
+        raise ValueError("--all can't be combined with filters")
+    return maintenance.all_of(*predicates)
+
+def _archive(args):
+    return HistoryStore(args.server, args.archive) if args.archive else None
+
+def cmd_cancel(args):
+    items = maintenance.cancel_queued(args.server, _selection(args), args.batch_size, args.interrupt_running)
+    return {"cancelled": [item.prompt_id for item in items]}
+
+def cmd_delete_history(args):
+    items = maintenance.delete_history(args.server, _selection(args), args.batch_size, _archive(args))
+    return {"deleted": [item.prompt_id for item in items]}
+
+def cmd_prune(args):
+    items = maintenance.prune_history(args.server, args.keep, args.max_age, args.batch_size, _archive(args))
+    return {"deleted": [item.prompt_id for item in items]}
+
+def cmd_watch(args):
+    import asyncio
+
+    async def watch():
+        async for event in comfy_api.watch(args.server, args.client_id, _items(args.prompt_ids) or None):
+            print(json.dumps(event), flush=True)
+    asyncio.run(watch())
+    return None
+
+# =======================================================================
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless ComfyUI API client (JSON output)")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help="host:port (default $COMFYUI_SERVER or 127.0.0.1:8188)")
+    parser.add_argument('--pretty', action='store_true', help="indent the JSON output")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def command(name, fn, help_text):
+        sub = commands.add_parser(name, help=help_text)
+        sub.set_defaults(fn=fn)
+        return sub
+
+    command('stats', cmd_stats, "system stats (OS, python, GPUs)")
+    command('queue', cmd_queue, "running and pending prompts")
+    command('prompt', cmd_prompt, "number of prompts remaining")
+    command('embeddings', cmd_embeddings, "available embeddings")
+    command('extensions', cmd_extensions, "web extensions")
+    sub = command('object-info', cmd_object_info, "node schemas, all or some classes")
+    sub.add_argument('node_class', nargs='*')
+    command('clear', cmd_clear, "clear the pending queue")
+    command('interrupt', cmd_interrupt, "interrupt the running prompt")
+
+    sub = command('delete', cmd_delete, "delete pending prompts")
+    sub.add_argument('prompt_ids', nargs='*', help="prompt ids, or - to read them from stdin")
+    sub.add_argument('--queue-number', type=int, action='append', help="select by queue number instead (repeatable)")
+
+    sub = command('history', cmd_history, "history of finished prompts")
+    sub.add_argument('prompt_ids', nargs='*', help="only these prompts (- for stdin)")
+    sub.add_argument('--max-items', type=int)
+    sub.add_argument('--summary', action='store_true', help="only ids and output files")
+
+    sub = command('view', cmd_view, "download output files")
+    sub.add_argument('filenames', nargs='+', help="filenames, or - to read them from stdin")
+    sub.add_argument('--out', default='.', help="destination directory")
+    sub.add_argument('--type', default=None, help="output, input or temp")
+    sub.add_argument('--subfolder', default=None)
+    sub.add_argument('--workers', type=int, default=4)
+
+    sub = command('upload', cmd_upload, "upload images or masks")
+    sub.add_argument('paths', nargs='+', help="files, or - to read paths from stdin")
+    sub.add_argument('--subfolder', default=None)
+    sub.add_argument('--overwrite', action='store_true')
+    sub.add_argument('--mask', action='store_true', help="upload as mask (to /upload/mask)")
+    sub.add_argument('--original', help="filename of the image the mask belongs to")
+    sub.add_argument('--original-subfolder', default=None)
+    sub.add_argument('--workers', type=int, default=4)
+
+    sub = command('submit', cmd_submit, "queue a workflow (API format)")
+    sub.add_argument('workflow', help="workflow_api.json")
+    sub.add_argument('--set', type=_parse_set, action='append', default=[], metavar='NODE.INPUT=VALUE',
+                     help="set an input, NODE is a title or id (repeatable)")
+    sub.add_argument('--count', type=int, default=1)
+    sub.add_argument('--concurrency', type=int, default=4)
+    sub.add_argument('--client-id', default=str(uuid.uuid4()))
+    sub.add_argument('--validate', action='store_true', help="check against the server's node schemas first")
+    sub.add_argument('--wait', action='store_true', help="wait for the prompts and include their outputs")
+
+    def selection_arguments(sub, statuses):
+        sub.add_argument('--client-id', action='append', help="only prompts of this client (repeatable)")
+        sub.add_argument('--status', action='append', choices=statuses, help="only prompts with this status (repeatable)")
+        sub.add_argument('--batch-size', type=int, default=100, help="prompt_ids per POST")
+        sub.add_argument('--all', action='store_true', help="select every prompt (required without filters)")
+
+    sub = command('cancel', cmd_cancel, "delete pending prompts selected by client/status")
+    selection_arguments(sub, ["pending", "running"])
+    sub.add_argument('--interrupt-running', action='store_true', help="also interrupt a matching running prompt")
+
+    sub = command('delete-history', cmd_delete_history, "delete history entries selected by client/status/age")
+    selection_arguments(sub, ["success", "error"])
+    sub.add_argument('--older-than', type=float, metavar='SECONDS')
+    sub.add_argument('--archive', help="store the entries in this HistoryStore database first")
+
+    sub = command('prune', cmd_prune, "retention: keep the newest N entries and/or nothing older than SECONDS")
+    sub.add_argument('--keep', type=int)
+    sub.add_argument('--max-age', type=float, metavar='SECONDS')
+    sub.add_argument('--batch-size', type=int, default=100)
+    sub.add_argument('--archive', help="store the entries in this HistoryStore database first")
+
+    sub = command('watch', cmd_watch, "print websocket events as JSON lines")
+    sub.add_argument('prompt_ids', nargs='*', help="stop after these finished (default: when the queue is empty)")
+    sub.add_argument('--client-id', required=True, help="client id the prompts were submitted with")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        result = args.fn(args)
+    except Exception as e:
+        print(json.dumps(_jsonable(e)), file=sys.stderr)
+        return 1
+    if result is not None:
+        print(json.dumps(_jsonable(result), indent=2 if args.pretty else None))
+    return 1 if _failed(result) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib import parse
+from http_client import get_client, HttpError
+import uploads
+
+# =======================================================================
+# non-interactive API over the ComfyUI endpoints. nothing here prompts,
+# prints or sleeps: every function takes its inputs as arguments and returns
+# the server's data, errors are raised (HttpError / OSError).
+# functions that take many items (delete, view, upload) do them in one
+# request or in parallel, for batch use from scripts and cron jobs
+
+def system_stats(server_address):
+    return get_client(server_address).get_json('/system_stats')
+
+def queue(server_address):
+    return get_client(server_address).get_json('/queue')
+
+# only the number of prompts running or pending
+def prompt_status(server_address):
+    return get_client(server_address).get_json('/prompt')
+
+def embeddings(server_address):
+    return get_client(server_address).get_json('/embeddings')
+
+def extensions(server_address):
+    return get_client(server_address).get_json('/extensions')
+
+def object_info(server_address, node_class=None):
+    path = '/object_info' if node_class is None else f'/object_info/{parse.quote(node_class)}'
+    return get_client(server_address).get_json(path)
+
+# (class, schema) one node class at a time, only node_classes if given
+def iter_object_info(server_address, node_classes=None):
+    keys = set(node_classes) if node_classes is not None else None
+    return get_client(server_address).iter_json('/object_info', keys)
+
+# ===================================================================
+# clears the pending queue, the running job still completes
+def clear_queue(server_address):
+    get_client(server_address).post_json('/queue', {'clear': True}).raise_for_status()
+
+# delete pending prompts, all of them in one request
+def delete_queue_items(server_address, prompt_ids):
+    get_client(server_address).post_json('/queue', {'delete': list(prompt_ids)}).raise_for_status()
+
+# prompt_ids of pending prompts by their queue number (the "id" in /queue)
+def prompt_ids_for_queue_numbers(server_address, queue_numbers):
+    wanted = {int(number) for number in queue_numbers}
+    return [task[1] for task in queue(server_address).get("queue_pending", []) if task[0] in wanted]
+
+# interrupt the running prompt
+def interrupt(server_address):
+    get_client(server_address).request('POST', '/interrupt', headers={'Content-Type': 'application/json'}).raise_for_status()
+
+# ===================================================================
+def history(server_address, prompt_id=None, max_items=None):
+    path = '/history' if prompt_id is None else f'/history/{prompt_id}'
+    if max_items is not None:
+        path += f'?max_items={max_items}'
+    return get_client(server_address).get_json(path)
+
+# (prompt_id, entry) one history entry at a time, parsed while the response is
+# read, so a large history is never in memory as a whole
+def iter_history(server_address, max_items=None, prompt_ids=None):
+    path = '/history' if max_items is None else f'/history?max_items={max_items}'
+    keys = set(prompt_ids) if prompt_ids is not None else None
+    return get_client(server_address).iter_json(path, keys)
+
+# history_summary() of every entry, streamed
+def iter_history_summaries(server_address, max_items=None):
+    for prompt_id, entry in iter_history(server_address, max_items):
+        yield history_summary(prompt_id, entry)
+
+# flat summary of one history entry: ids plus its files by type
+def history_summary(prompt_id, entry):
+    queue_number, _, _, extra_data = entry["prompt"][:4]
+    files = {}
+    for node_output in entry.get("outputs", {}).values():
+        for image in node_output.get("images", []):
+            filename = image["filename"]
+            if image.get("subfolder"):
+                filename = f'{image["subfolder"]}/{filename}'
+            files.setdefault(image.get("type", "output"), []).append(filename)
+    return {"prompt_id": prompt_id, "queue_number": queue_number,
+            "client_id": extra_data.get("client_id"), "files": files}
+
+# ===================================================================
+def _view_path(filename, image_type=None, subfolder=None, preview=None, channel=None):
+    params = {'filename': filename}
+    for name, value in (('type', image_type), ('subfolder', subfolder), ('preview', preview), ('channel', channel)):
+        if value is not None:
+            params[name] = value
+    return f"/view?{parse.urlencode(params)}"
+
+# the bytes of a file from /view
+def view(server_address, filename, image_type=None, subfolder=None, preview=None, channel=None):
+    path = _view_path(filename, image_type, subfolder, preview, channel)
+    return get_client(server_address).request('GET', path).raise_for_status().body
+
+# stream one file from /view to dest_dir, returns the path written
+def download(server_address, filename, dest_dir, image_type=None, subfolder=None, chunk_size=64 * 1024):
+    target = os.path.join(dest_dir, os.path.basename(filename))
+    with get_client(server_address).stream('GET', _view_path(filename, image_type, subfolder)) as response:
+        if response.status != 200:
+            body = response.read()
+            raise HttpError(response.status, response.reason, body)
+        with open(target + '.part', 'wb') as file:
+            while chunk := response.read(chunk_size):
+                file.write(chunk)
+    os.replace(target + '.part', target)
+    return target
+
+# download many files in parallel, returns {filename: path or exception}
+def download_many(server_address, filenames, dest_dir, image_type=None, subfolder=None, workers=4):
+    os.makedirs(dest_dir, exist_ok=True)
+    return _parallel(lambda name: download(server_address, name, dest_dir, image_type, subfolder), filenames, workers)
+
+# upload many files in parallel, returns {path: response or exception}
+def upload_many(server_address, paths, subfolder=None, overwrite=False, original_ref=None, mask=False, workers=4):
+    def upload_one(path):
+        return uploads.upload_file(server_address, path, subfolder=subfolder, overwrite=overwrite,
+                                   original_ref=original_ref, mask=mask)
+    return _parallel(upload_one, paths, workers)
+
+def _parallel(fn, items, workers):
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(item, executor.submit(fn, item)) for item in items]
+        for item, future in futures:
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                results[item] = e
+    return results
+
+# ===================================================================
+# websocket events for client_id as {"type", "data"} dicts, until every
+# prompt in prompt_ids finished (or, without prompt_ids, until the server
+# reports an empty queue).
+# prompt messages are only sent to the client_id that submitted the prompt
+async def watch(server_address, client_id, prompt_ids=None, timeout=10):
+    # asyncio and the websocket client are only imported by the commands that need them
+    import asyncio
+    import ws_events
+    ws_client = ws_events.EventClient(server_address, client_id, timeout=timeout)
+    events = asyncio.Queue()
+
+    async def forward(event):
+        events.put_nowait(event)
+    ws_client.on("*", forward)
+    await ws_client.connect()
+    task = asyncio.create_task(ws_client.run())
+
+    remaining = set(prompt_ids or ())
+    try:
+        # prompts that finished before the websocket was connected
+        loop = asyncio.get_running_loop()
+        for prompt_id in list(remaining):
+            if prompt_id in await loop.run_in_executor(None, history, server_address, prompt_id):
+                remaining.discard(prompt_id)
+        if prompt_ids and not remaining:
+            return
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                return  # connection closed
+            event = getter.result()
+            yield {"type": event.type, "data": event.data}
+            if prompt_ids:
+                if isinstance(event, ws_events.ExecutingEvent) and event.done:
+                    remaining.discard(event.prompt_id)
+                    if not remaining:
+                        return
+            elif isinstance(event, ws_events.StatusEvent) and event.queue_remaining == 0:
+                return
+    finally:
+        await ws_client.close()
+        await task
@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import os
+import struct
+import tempfile
+import uuid
+from collections import deque
+import json_codec
+from ws_events import EventClient, ExecutingEvent, decode_event
+from ws_session import Session
+
+# =======================================================================
+# local fan-out of one server's websocket events to many worker processes.
+# ComfyUI sends every status/preview message to every connection, so dozens
+# of workers with their own /ws connection cost the server dozens of sends
+# per event and every worker decodes events it doesn't care about. the hub
+# holds one upstream connection (a ws_session.Session, which reconnects and
+# recovers missed prompts) and re-publishes events over a Unix socket to
+# subscribers, filtered by prompt_id and event type.
+# prompt messages only go to the client_id that submitted the prompt, so
+# workers submit with the hub's client_id (HubClient.client_id):
+#   python event_hub.py --server 127.0.0.1:8188        (one hub per server)
+#   hub = HubClient(default_socket_path(server_address), prompt_ids=[], types=["executing", "executed"])
+#   await hub.connect(); task = asyncio.create_task(hub.run())
+#   prompt_id = queue_prompt(workflow, hub.server_address, hub.client_id)['prompt_id']
+#   async for event in hub.follow(prompt_id): ...
+# HubClient is an EventClient, so everything that attaches to one (on(),
+# follow(), ResultCache.attach, PreviewBuffer.attach, ...) works with it.
+
+# frames in both directions: kind (1 byte) + length (4 bytes) + payload.
+# JSON frames hold {"type", "data"} events (hub -> subscriber) or commands,
+# PREVIEW frames the binary preview messages as they came from the server
+FRAME = struct.Struct('>BI')
+KIND_JSON = 0
+KIND_PREVIEW = 1
+
+# events a slow subscriber can miss without losing track of a prompt
+LOSSY_TYPES = {"progress"}
+
+def default_socket_path(server_address):
+    return os.path.join(tempfile.gettempdir(), f"comfyui-hub-{server_address.replace(':', '-')}.sock")
+
+async def read_frame(reader):
+    kind, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length)
+
+def write_frame(writer, kind, payload):
+    writer.write(FRAME.pack(kind, len(payload)))
+    writer.write(payload)
+
+# =======================================================================
+# one connected worker: its filter and a bounded queue of frames (lists of
+# (kind, payload), a replay is one item), written by its own task so a slow
+# reader never blocks the hub or other workers.
+# when the queue is full, lossy events (progress, previews) are dropped and
+# anything else disconnects the subscriber, it has fallen too far behind
+# (reconnecting and checking /history is cheaper than an unbounded backlog)
+class _Subscriber:
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.subscribed = False
+        self.prompt_ids = None  # None: every prompt
+        self.types = None  # None: every event type
+        self.previews = False
+        self.sent = 0
+        self.dropped = 0
+
+    def wants(self, event_type, prompt_id):
+        if not self.subscribed or (self.types is not None and event_type not in self.types):
+            return False
+        # status messages (and progress of older servers) carry no prompt_id
+        return self.prompt_ids is None or prompt_id is None or prompt_id in self.prompt_ids
+
+    # False if the subscriber has to be disconnected
+    def offer(self, frames, lossy):
+        try:
+            self.queue.put_nowait(frames)
+        except asyncio.QueueFull:
+            if not lossy:
+                return False
+            self.dropped += 1
+        return True
+
+    async def write_loop(self):
+        while True:
+            frames = await self.queue.get()
+            for kind, payload in frames:
+                write_frame(self.writer, kind, payload)
+            await self.writer.drain()
+            self.sent += len(frames)
+
+# =======================================================================
+# subscriber commands (JSON frames):
+#   {"op": "subscribe", "prompt_ids": [...] or null, "types": [...] or null, "previews": false}
+#   {"op": "add", "prompt_ids": [...]}      also replays their recent events
+#   {"op": "remove", "prompt_ids": [...]}
+# prompt_ids are removed from a filter once the prompt is done. events
+# of the last `replay` events are kept, so a worker that adds its prompt_id
+# right after submitting still gets the events that came in between
+class EventHub:
+    def __init__(self, server_address, socket_path=None, client_id=None, queue_size=256, replay=1024):
+        self.server_address = server_address
+        self.socket_path = socket_path or default_socket_path(server_address)
+        self.queue_size = queue_size
+        self.session = Session(server_address, client_id or str(uuid.uuid4()))
+        self.session.on("*", self._publish)
+        self.session.on_preview(self._publish_preview)
+        self._subscribers = set()
+        self._recent = deque(maxlen=replay)  # (prompt_id, type, payload, done)
+        self._server = None
+        self.published = 0
+        self.disconnected = 0
+
+    @property
+    def client_id(self):
+        return self.session.client_id
+
+    # ===================================================================
+    async def _publish(self, event):
+        # encoded once, shared by every subscriber
+        payload = json_codec.dumps({"type": event.type, "data": event.data})
+        self.published += 1
+        done = isinstance(event, ExecutingEvent) and event.done
+        if event.prompt_id is not None:
+            self._recent.append((event.prompt_id, event.type, payload, done))
+        for subscriber in list(self._subscribers):
+            if subscriber.wants(event.type, event.prompt_id):
+                if not subscriber.offer([(KIND_JSON, payload)], event.type in LOSSY_TYPES):
+                    self._disconnect(subscriber)
+                    continue
+            if done and subscriber.prompt_ids is not None:
+                subscriber.prompt_ids.discard(event.prompt_id)
+        # the session reads a burst of buffered messages without yielding,
+        # let the write loops move the queues into the sockets in between
+        await asyncio.sleep(0)
+
+    async def _publish_preview(self, view):
+        payload = None
+        for subscriber in list(self._subscribers):
+            if subscriber.previews and subscriber.subscribed:
+                if payload is None:
+                    payload = bytes(view)
+                subscriber.offer([(KIND_PREVIEW, payload)], lossy=True)
+
+    def _disconnect(self, subscriber):
+        self._subscribers.discard(subscriber)
+        self.disconnected += 1
+        # abort, close() would wait for the backlog to be flushed first
+        subscriber.writer.transport.abort()
+
+    def _command(self, subscriber, command):
+        op = command.get("op")
+        prompt_ids = command.get("prompt_ids")
+        if op == "subscribe":
+            subscriber.subscribed = True
+            subscriber.prompt_ids = set(prompt_ids) if prompt_ids is not None else None
+            subscriber.types = set(command["types"]) if command.get("types") is not None else None
+            subscriber.previews = bool(command.get("previews"))
+            added = prompt_ids or ()
+        elif op == "add":
+            if subscriber.prompt_ids is not None:
+                subscriber.prompt_ids.update(prompt_ids)
+            added = prompt_ids
+        elif op == "remove":
+            if subscriber.prompt_ids is not None:
+                subscriber.prompt_ids.difference_update(prompt_ids)
+            return
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+        added = set(added)
+        for prompt_id in added:
+            # reconciled by the session if the connection drops before it is done
+            self.session.track(prompt_id)
+        replay = []
+        for prompt_id, event_type, payload, done in self._recent:
+            if prompt_id in added:
+                if subscriber.wants(event_type, prompt_id):
+                    replay.append((KIND_JSON, payload))
+                if done and subscriber.prompt_ids is not None:
+                    subscriber.prompt_ids.discard(prompt_id)
+        if replay and not subscriber.offer(replay, lossy=False):
+            self._disconnect(subscriber)
+
+    async def _serve_subscriber(self, reader, writer):
+        subscriber = _Subscriber(writer, self.queue_size)
+        hello = {"type": "hello", "data": {"server_address": self.server_address, "client_id": self.client_id}}
+        write_frame(writer, KIND_JSON, json_codec.dumps(hello))
+        self._subscribers.add(subscriber)
+        writing = asyncio.create_task(subscriber.write_loop())
+        try:
+            while subscriber in self._subscribers:
+                kind, payload = await read_frame(reader)
+                self._command(subscriber, json_codec.loads(payload))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, KeyError, TypeError):
+            pass  # gone, or sent something that isn't a command
+        finally:
+            self._subscribers.discard(subscriber)
+            writing.cancel()
+            writer.close()
+
+    # ===================================================================
+    # serve until stop(). a socket file left over by a hub that died is
+    # replaced, one that still accepts connections means a hub is running
+    async def run(self):
+        if os.path.exists(self.socket_path):
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+                writer.close()
+                raise RuntimeError(f"a hub is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve_subscriber, path=self.socket_path)
+        try:
+            await self.session.run()  # until stop()
+        finally:
+            self._server.close()
+            for subscriber in list(self._subscribers):
+                self._subscribers.discard(subscriber)
+                subscriber.writer.transport.abort()
+            await self._server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def stop(self):
+        await self.session.close()
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": sum(subscriber.dropped for subscriber in self._subscribers),
+            "disconnected": self.disconnected,
+            "reconnects": self.session.reconnects,
+        }
+
+# =======================================================================
+# a worker's connection to the hub, used like an EventClient. the filter
+# (prompt_ids, types) is applied in the hub, so only matching events are
+# sent and decoded here. prompt_ids=[] starts with no prompts, follow()
+# adds the prompt it follows. server_address and client_id come from the hub.
+# run() reconnects when the hub drops the connection (it disconnects
+# subscribers that fall behind, or was restarted) and subscribes again, the
+# hub replays the recent events of the prompts. after `reconnects` failed
+# attempts in a row it gives up: followers fail with ConnectionError and
+# run() raises it
+class HubClient(EventClient):
+    def __init__(self, socket_path, prompt_ids=None, types=None, previews=False, timeout=10,
+                 reconnects=5, backoff=0.5):
+        super().__init__(None, None, timeout)
+        self.socket_path = socket_path
+        self.prompt_ids = set(prompt_ids) if prompt_ids is not None else None
+        self.types = list(types) if types is not None else None
+        self.previews = previews
+        self.reconnects = reconnects
+        self.backoff = backoff
+        self.dropped = 0  # times the hub connection was lost
+        self._closing = False
+
+    async def _send(self, command):
+        write_frame(self._writer, KIND_JSON, json_codec.dumps(command))
+        await self._writer.drain()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.socket_path), self.timeout)
+        _, payload = await asyncio.wait_for(read_frame(self._reader), self.timeout)
+        hello = json_codec.loads(payload)["data"]
+        self.server_address = hello["server_address"]
+        self.client_id = hello["client_id"]
+        prompt_ids = sorted(self.prompt_ids) if self.prompt_ids is not None else None
+        await self._send({"op": "subscribe", "prompt_ids": prompt_ids, "types": self.types,
+                          "previews": self.previews})
+
+    # start receiving the events of these prompts (no-op without a prompt filter).
+    # if the connection is down, run() subscribes to them when it reconnects
+    async def add(self, *prompt_ids):
+        if self.prompt_ids is None:
+            return
+        self.prompt_ids.update(prompt_ids)
+        if self._writer is not None:
+            try:
+                await self._send({"op": "add", "prompt_ids": list(prompt_ids)})
+            except ConnectionError:
+                pass
+
+    async def _followed(self, prompt_id):
+        await self.add(prompt_id)
+
+    async def close(self):
+        self._closing = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    # receive and dispatch until close()
+    async def run(self):
+        self._closing = False
+        attempt = 0
+        while not self._closing:
+            if self._writer is None:
+                try:
+                    await self.connect()
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, KeyError) as e:
+                    if attempt >= self.reconnects:
+                        error = ConnectionError(f"lost the event hub at {self.socket_path}: {e!r}")
+                        self.fail(error)
+                        raise error from e
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+                    attempt += 1
+                    continue
+            attempt = 0
+            try:
+                while True:
+                    kind, payload = await read_frame(self._reader)
+                    if kind == KIND_JSON:
+                        await self.dispatch(decode_event(payload))
+                    else:
+                        view = memoryview(payload)
+                        for handler in self._preview_handlers:
+                            await self._call(handler, view)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                if not self._closing:
+                    self.dropped += 1
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+
+# =======================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share one ComfyUI websocket between local workers")
+    parser.add_argument('--server', default=os.environ.get('COMFYUI_SERVER', '127.0.0.1:8188'))
+    parser.add_argument('--socket', help="Unix socket path (default: one per server in the temp dir)")
+    parser.add_argument('--client-id', help="upstream client id (default: random)")
+    parser.add_argument('--queue-size', type=int, default=256, help="frames buffered per subscriber")
+    args = parser.parse_args(argv)
+
+    hub = EventHub(args.server, args.socket, args.client_id, args.queue_size)
+    print(f"hub for {args.server} on {hub.socket_path}, client_id={hub.client_id}", flush=True)
+    try:
+        asyncio.run(hub.run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import parse
+import ws_protocol
+from workflow import node_signatures
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def _load_data(name):
+    with open(os.path.join(DATA_DIR, name), 'r') as file:
+        return json.load(file)
+
+# =======================================================================
+# stand-in ComfyUI server for benchmarks and tests, no GPU needed.
+# implements the endpoints in data/endpoints.txt and replays the websocket
+# messages from data/message_*.json for every queued prompt:
+#   step_time     - seconds per sampler step (nodes with a "steps" input)
+#   max_steps     - cap on the steps actually simulated per sampler
+#   preview_every - send a binary preview frame every N steps (0 = never)
+#   preview_size  - size of the fake JPEG payload in each preview frame
+#   image_size    - size of every file served from /view
+# run it in-process with start()/stop(), or `python fake_server.py [port]`
+class FakeComfyServer:
+    def __init__(self, host='127.0.0.1', port=0, step_time=0.0, max_steps=20, preview_every=0,
+                 preview_size=16 * 1024, image_size=256 * 1024):
+        self.step_time = step_time
+        self.max_steps = max_steps
+        self.preview_every = preview_every
+        self.preview_size = preview_size
+        self.image_size = image_size
+
+        self.queue = deque()  # [number, prompt_id, prompt, extra_data, outputs_to_execute]
+        self.running = None
+        self.history = {}
+        self.uploads = {}  # (type, subfolder, filename) -> bytes
+        self.counter = 0
+        self.interrupted = False
+        self._last_signatures = set()  # of the previous prompt's nodes
+        self._lock = threading.Condition()
+        self._clients = []  # (client_id, socket, send lock)
+        self._stop = False
+
+        self.system_stats = _load_data('get_system_stats.json')
+        self.object_info = _load_data('get_object_info.json')
+
+        handler = type('FakeComfyHandler', (_Handler,), {'fake': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.server_address = f"{host}:{self.httpd.server_address[1]}"
+        self._threads = []
+
+    # ===================================================================
+    def start(self):
+        for target in (self.httpd.serve_forever, self._worker):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._stop = True
+            self._lock.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for _, sock, _ in list(self._clients):
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # preload history, e.g. with data/get_history.json
+    def load_history(self, history):
+        with self._lock:
+            self.history.update(history)
+
+    # ===================================================================
+    def queue_prompt(self, prompt, client_id):
+        with self._lock:
+            prompt_id = str(uuid.uuid4())
+            number = self.counter
+            self.counter += 1
+            outputs = [node_id for node_id, node in prompt.items() if node.get("class_type") in ("SaveImage", "PreviewImage")]
+            self.queue.append([number, prompt_id, prompt, {"client_id": client_id}, outputs])
+            self._lock.notify_all()
+        self.broadcast_status()
+        return prompt_id, number
+
+    def queue_remaining(self):
+        return len(self.queue) + (1 if self.running else 0)
+
+    def broadcast_status(self, sid=None):
+        data = {"status": {"exec_info": {"queue_remaining": self.queue_remaining()}}}
+        if sid:
+            data["sid"] = sid
+        self.send_json({"type": "status", "data": data}, sid)
+
+    # ===================================================================
+    # websocket fan-out, clients are plain sockets from hijacked requests.
+    # like the real server, messages with a sid only go to that client
+    def add_client(self, client_id, sock):
+        entry = (client_id, sock, threading.Lock())
+        self._clients.append(entry)
+        self.broadcast_status(sid=client_id)
+        return entry
+
+    def remove_client(self, entry):
+        if entry in self._clients:
+            self._clients.remove(entry)
+
+    def send_json(self, message, sid=None):
+        self._send(ws_protocol.encode_frame(ws_protocol.OP_TEXT, json.dumps(message).encode('utf-8'), False), sid)
+
+    def send_preview(self, sid=None, image_format=1):
+        header = struct.pack(">II", 1, image_format)  # PREVIEW_IMAGE, 1 = JPEG
+        payload = header + b'\xff\xd8' + bytes(self.preview_size)
+        self._send(ws_protocol.encode_frame(ws_protocol.OP_BINARY, payload, False), sid)
+
+    def _send(self, frame, sid=None):
+        for entry in list(self._clients):
+            client_id, sock, lock = entry
+            if sid is not None and client_id != sid:
+                continue
+            try:
+                with lock:
+                    sock.sendall(frame)
+            except OSError:
+                self.remove_client(entry)
+
+    # ===================================================================
+    # executes queued prompts one at a time, like the real server
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self.queue and not self._stop:
+                    self._lock.wait()
+                if self._stop:
+                    return
+                self.running = self.queue.popleft()
+                self.interrupted = False
+            self._execute(self.running)
+            with self._lock:
+                self.running = None
+            self.broadcast_status()
+
+    def _execute(self, item):
+        number, prompt_id, prompt, extra_data, outputs = item
+        sid = extra_data.get("client_id")
+        self.send_json({"type": "execution_start", "data": {"prompt_id": prompt_id}}, sid)
+
+        # like ComfyUI, a node is cached when it and everything upstream of it
+        # is unchanged since the previous prompt
+        signatures = node_signatures(prompt)
+        cached = [node_id for node_id, signature in signatures.items() if signature in self._last_signatures]
+        self._last_signatures = set(signatures.values())
+        self.send_json({"type": "execution_cached", "data": {"nodes": cached, "prompt_id": prompt_id}}, sid)
+
+        node_outputs = {}
+        for node_id, node in prompt.items():
+            if node_id in cached:
+                continue
+            if self.interrupted:
+                self.send_json({"type": "execution_interrupted", "data": {"prompt_id": prompt_id, "node_id": node_id}}, sid)
+                break
+            self.send_json({"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}}, sid)
+            steps = node.get("inputs", {}).get("steps")
+            if isinstance(steps, int):
+                total = min(steps, self.max_steps)
+                for step in range(1, total + 1):
+                    if self.step_time:
+                        time.sleep(self.step_time)
+                    self.send_json({"type": "progress", "data": {"value": step, "max": total, "prompt_id": prompt_id, "node": node_id}}, sid)
+                    if self.preview_every and step % self.preview_every == 0:
+                        self.send_preview(sid)
+            if node_id in outputs:
+                image_type = "output" if node.get("class_type") == "SaveImage" else "temp"
+                prefix = node.get("inputs", {}).get("filename_prefix", "ComfyUI")
+                images = [{"filename": f"{prefix}_{number:05d}_.png", "subfolder": "", "type": image_type}]
+                node_outputs[node_id] = {"images": images}
+                self.send_json({"type": "executed", "data": {"node": node_id, "output": {"images": images}, "prompt_id": prompt_id}}, sid)
+
+        self.send_json({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}, sid)
+        with self._lock:
+            self.history[prompt_id] = {"prompt": item, "outputs": node_outputs}
+
+# =======================================================================
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake = None
+
+    def setup(self):
+        super().setup()
+        # headers and body are written separately, don't let Nagle delay the body
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, status=200, content_type='application/json'):
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    # ===================================================================
+    def do_GET(self):
+        fake = self.fake
+        url = parse.urlsplit(self.path)
+        path = url.path
+        query = dict(parse.parse_qsl(url.query))
+
+        if path == '/ws':
+            return self._websocket(query.get('clientId') or uuid.uuid4().hex)
+        if path == '/':
+            return self._send(b'<html><body>fake ComfyUI</body></html>', content_type='text/html')
+        if path == '/embeddings':
+            return self._send([])
+        if path == '/extensions':
+            return self._send([])
+        if path == '/system_stats':
+            return self._send(fake.system_stats)
+        if path == '/prompt':
+            return self._send({"exec_info": {"queue_remaining": fake.queue_remaining()}})
+        if path == '/object_info':
+            return self._send(fake.object_info)
+        if path.startswith('/object_info/'):
+            node_class = parse.unquote(path[len('/object_info/'):])
+            return self._send({node_class: fake.object_info[node_class]} if node_class in fake.object_info else {})
+        if path.startswith('/view_metadata/'):
+            return self._send({"format": "pt"})
+        if path == '/history':
+            with fake._lock:
+                items = list(fake.history.items())
+            if 'max_items' in query:
+                items = items[-int(query['max_items']):]
+            return self._send(dict(items))
+        if path.startswith('/history/'):
+            prompt_id = path[len('/history/'):]
+            with fake._lock:
+                entry = fake.history.get(prompt_id)
+            return self._send({prompt_id: entry} if entry else {})
+        if path == '/queue':
+            with fake._lock:
+                running = [fake.running] if fake.running else []
+                pending = list(fake.queue)
+            return self._send({"queue_running": running, "queue_pending": pending})
+        if path == '/view':
+            key = (query.get('type', 'output'), query.get('subfolder', ''), query.get('filename', ''))
+            body = fake.uploads.get(key)
+            if body is None:
+                if not key[2]:
+                    return self._send(b'', status=404, content_type='text/plain')
+                body = b'\x89PNG\r\n\x1a\n' + bytes(fake.image_size - 8)
+            return self._send(body, content_type='image/png')
+        self._send(b'', status=404, content_type='text/plain')
+
+    def do_POST(self):
+        fake = self.fake
+        path = parse.urlsplit(self.path).path
+        body = self._read_body()
+
+        if path == '/prompt':
+            request_payload = json.loads(body)
+            prompt_id, number = fake.queue_prompt(request_payload["prompt"], request_payload.get("client_id"))
+            return self._send({"prompt_id": prompt_id, "number": number, "node_errors": {}})
+        if path == '/queue':
+            request_payload = json.loads(body or b'{}')
+            with fake._lock:
+                if request_payload.get('clear'):
+                    fake.queue.clear()
+                delete = set(request_payload.get('delete', []))
+                if delete:
+                    fake.queue = deque(item for item in fake.queue if item[1] not in delete)
+            fake.broadcast_status()
+            return self._send(b'', content_type='text/plain')
+        if path == '/history':
+            request_payload = json.loads(body or b'{}')
+            with fake._lock:
+                if request_payload.get('clear'):
+                    fake.history.clear()
+                for prompt_id in request_payload.get('delete', []):
+                    fake.history.pop(prompt_id, None)
+            return self._send(b'', content_type='text/plain')
+        if path == '/interrupt':
+            fake.interrupted = True
+            return self._send(b'', content_type='text/plain')
+        if path in ('/upload/image', '/upload/mask'):
+            return self._upload(body)
+        self._send(b'', status=404, content_type='text/plain')
+
+    # ===================================================================
+    def _upload(self, body):
+        import email.parser
+        import email.policy
+        head = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('latin1')
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(head + body)
+        fields, image, filename = {}, None, None
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'image':
+                image = part.get_payload(decode=True)
+                filename = part.get_filename()
+            else:
+                fields[name] = part.get_payload(decode=True).decode('utf-8')
+        if image is None:
+            return self._send(b'', status=400, content_type='text/plain')
+        subfolder = fields.get('subfolder', '')
+        image_type = fields.get('type', 'input')
+        self.fake.uploads[(image_type, subfolder, filename)] = image
+        self._send({"name": filename, "subfolder": subfolder, "type": image_type})
+
+    def _websocket(self, client_id):
+        key = self.headers.get('Sec-WebSocket-Key', '')
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', ws_protocol.accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+
+        entry = self.fake.add_client(client_id, self.connection)
+        try:
+            # we don't care about client messages, just wait for the close frame / EOF
+            while True:
+                head = self.rfile.read(2)
+                if len(head) < 2:
+                    break
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self.rfile.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self.rfile.read(8))[0]
+                self.rfile.read(length + (4 if head[1] & 0x80 else 0))
+                if opcode == ws_protocol.OP_CLOSE:
+                    with entry[2]:
+                        self.connection.sendall(ws_protocol.encode_frame(ws_protocol.OP_CLOSE, b'\x03\xe8', False))
+                    break
+        except OSError:
+            pass
+        finally:
+            self.fake.remove_client(entry)
+            self.close_connection = True
+
+# =======================================================================
+if __name__ == '__main__':
+    import sys
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8188
+    server = FakeComfyServer(port=port, step_time=0.05).start()
+    print(f"fake ComfyUI server on {server.server_address}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
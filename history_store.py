@@ -0,0 +1,193 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from http_client import get_client
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    prompt_id TEXT PRIMARY KEY,
+    server_address TEXT,
+    queue_number INTEGER,
+    client_id TEXT,
+    status TEXT,
+    completed_at REAL,
+    entry TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    prompt_id TEXT,
+    node_id TEXT,
+    filename TEXT,
+    subfolder TEXT,
+    type TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    prompt_id TEXT,
+    node_id TEXT,
+    class_type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prompts_client ON prompts (client_id, completed_at);
+CREATE INDEX IF NOT EXISTS idx_prompts_queue_number ON prompts (queue_number);
+CREATE INDEX IF NOT EXISTS idx_prompts_completed ON prompts (completed_at);
+CREATE INDEX IF NOT EXISTS idx_outputs_prompt ON outputs (prompt_id);
+CREATE INDEX IF NOT EXISTS idx_outputs_filename ON outputs (filename);
+CREATE INDEX IF NOT EXISTS idx_nodes_prompt ON nodes (prompt_id, node_id);
+CREATE INDEX IF NOT EXISTS idx_nodes_class ON nodes (class_type);
+"""
+
+# =======================================================================
+# completion time of a history entry. newer servers include status messages
+# with millisecond timestamps, otherwise fall back to the time we saw it
+def completed_at(entry, default):
+    for message_type, data in (entry.get("status") or {}).get("messages", []):
+        if message_type in ("execution_success", "execution_error", "execution_interrupted") and "timestamp" in data:
+            return data["timestamp"] / 1000
+    return default
+
+# =======================================================================
+# local SQLite mirror of a server's /history, keyed by prompt_id and indexed
+# by client_id, queue number, output filename and node class.
+# only prompts we haven't seen are fetched (one /history/{prompt_id} each,
+# e.g. when their completion event arrives), so queries like "all outputs
+# for client X in the last hour" never re-download the full history
+class HistoryStore:
+    def __init__(self, server_address, path='history.sqlite3'):
+        self.server_address = server_address
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ===================================================================
+    def has(self, prompt_id):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM prompts WHERE prompt_id = ?", (prompt_id,)).fetchone()
+        return row is not None
+
+    # store one /history entry (replacing an older copy of it)
+    def add_entry(self, prompt_id, entry):
+        queue_number, _, prompt_workflow, extra_data = entry["prompt"][:4]
+        status = (entry.get("status") or {}).get("status_str")
+        finished_at = completed_at(entry, time.time())
+
+        outputs = []
+        for node_id, node_output in (entry.get("outputs") or {}).items():
+            for image in node_output.get("images", []):
+                outputs.append((prompt_id, node_id, image["filename"], image.get("subfolder", ""), image.get("type")))
+        nodes = [(prompt_id, node_id, node.get("class_type", "")) for node_id, node in prompt_workflow.items()]
+
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM outputs WHERE prompt_id = ?", (prompt_id,))
+            self._db.execute("DELETE FROM nodes WHERE prompt_id = ?", (prompt_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (prompt_id, self.server_address, queue_number, extra_data.get("client_id"),
+                 status, finished_at, json.dumps(entry)),
+            )
+            self._db.executemany("INSERT INTO outputs VALUES (?, ?, ?, ?, ?)", outputs)
+            self._db.executemany("INSERT INTO nodes VALUES (?, ?, ?)", nodes)
+
+    # ===================================================================
+    # fetch one prompt if we don't have it yet, returns True if it was added
+    def sync_prompt(self, prompt_id):
+        if self.has(prompt_id):
+            return False
+        history = get_client(self.server_address).get_json(f'/history/{prompt_id}')
+        if prompt_id not in history:
+            return False  # not finished yet
+        self.add_entry(prompt_id, history[prompt_id])
+        return True
+
+    # fetch the most recent max_items entries and add the ones we haven't
+    # seen. servers that don't support max_items return everything, so use
+    # this for the initial catch-up and sync_prompt() / attach() afterwards
+    def sync(self, max_items=None):
+        path = '/history' if max_items is None else f'/history?max_items={max_items}'
+        history = get_client(self.server_address).get_json(path)
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT prompt_id FROM prompts")}
+        added = 0
+        for prompt_id, entry in history.items():
+            if prompt_id not in known:
+                self.add_entry(prompt_id, entry)
+                added += 1
+        return added
+
+    # sync every prompt as its completion event arrives (ws_events.EventClient)
+    def attach(self, ws_client):
+        async def on_executing(event):
+            if event.done and event.prompt_id is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.sync_prompt, event.prompt_id)
+        ws_client.on("executing", on_executing)
+        return self
+
+    # ===================================================================
+    # the stored /history entry for a prompt, or None
+    def entry(self, prompt_id):
+        with self._lock:
+            row = self._db.execute("SELECT entry FROM prompts WHERE prompt_id = ?", (prompt_id,)).fetchone()
+        return json.loads(row["entry"]) if row else None
+
+    # {prompt_id: completed_at} of the stored prompts among prompt_ids (the
+    # server's timestamp, or when the entry was stored if it had none)
+    def completion_times(self, prompt_ids):
+        prompt_ids = list(prompt_ids)
+        times = {}
+        with self._lock:
+            for start in range(0, len(prompt_ids), 500):
+                batch = prompt_ids[start:start + 500]
+                query = f"SELECT prompt_id, completed_at FROM prompts WHERE prompt_id IN ({','.join('?' * len(batch))})"
+                times.update((row["prompt_id"], row["completed_at"]) for row in self._db.execute(query, batch))
+        return times
+
+    # (prompt_id, entry) of the newest successful prompts (older servers
+    # don't report a status, those entries count as successful)
+    def recent(self, limit=None):
+        query = "SELECT prompt_id, entry FROM prompts WHERE status IS NULL OR status = 'success' ORDER BY completed_at DESC"
+        with self._lock:
+            rows = self._db.execute(query + " LIMIT ?", (limit if limit is not None else -1,)).fetchall()
+        return [(row["prompt_id"], json.loads(row["entry"])) for row in rows]
+
+    # output files matching all given filters, newest first.
+    # since is a unix timestamp, e.g. time.time() - 3600 for the last hour
+    def outputs(self, client_id=None, since=None, node_class=None, filename=None, output_type=None):
+        query = (
+            "SELECT o.prompt_id, o.node_id, o.filename, o.subfolder, o.type, p.client_id, p.queue_number, p.completed_at "
+            "FROM outputs o JOIN prompts p ON p.prompt_id = o.prompt_id"
+        )
+        conditions, params = [], []
+        if client_id is not None:
+            conditions.append("p.client_id = ?")
+            params.append(client_id)
+        if since is not None:
+            conditions.append("p.completed_at >= ?")
+            params.append(since)
+        if filename is not None:
+            conditions.append("o.filename = ?")
+            params.append(filename)
+        if output_type is not None:
+            conditions.append("o.type = ?")
+            params.append(output_type)
+        if node_class is not None:
+            # look the node up by (prompt_id, node_id), the class index is the slow plan here
+            conditions.append("EXISTS (SELECT 1 FROM nodes n INDEXED BY idx_nodes_prompt "
+                              "WHERE n.prompt_id = o.prompt_id AND n.node_id = o.node_id AND n.class_type = ?)")
+            params.append(node_class)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY p.completed_at DESC, p.queue_number DESC"
+
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query, params)]
+
+    # prompt_ids whose graph contains a node class
+    def prompts_with_class(self, class_type):
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT prompt_id FROM nodes WHERE class_type = ?", (class_type,))
+            return [row[0] for row in rows]
@@ -0,0 +1,239 @@
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from http import client
+from queue import LifoQueue, Empty
+import json_codec
+
+# =======================================================================
+# error raised for 4xx/5xx responses (like urllib's HTTPError)
+class HttpError(Exception):
+    def __init__(self, status, reason, body=b''):
+        super().__init__(f"HTTP {status}: {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class HttpResponse:
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json_codec.loads(self.body)
+
+    # mirrors urllib's behaviour of treating 4xx/5xx as an error
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(self.status, self.reason, self.body)
+        return self
+
+
+# =======================================================================
+# small keep-alive HTTP client for a single ComfyUI server.
+# holds up to max_connections open http.client connections and hands them
+# out to callers (thread-safe), so repeated requests reuse the same TCP socket
+# errors that mean the request never got a response and is worth retrying
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, client.BadStatusLine, client.IncompleteRead)
+# errors while sending on a reused socket the server had already closed
+SEND_ERRORS = (BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+# gateway/overload statuses worth retrying for idempotent requests
+TRANSIENT_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+DEFAULT_MAX_CONNECTIONS = 8
+
+class HttpClient:
+    def __init__(self, server_address, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=30, retries=3, backoff=0.25):
+        self.server_address = server_address
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # idle connections, most recently used first (warmest socket)
+        self._idle = LifoQueue()
+        # limits the number of connections open at the same time
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    # ===================================================================
+    # returns (connection, reused)
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait(), True
+        except Empty:
+            pass
+        try:
+            return self._connect(), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _connect(self):
+        conn = client.HTTPConnection(self.server_address, timeout=self.timeout)
+        conn.connect()
+        # small JSON requests should not wait on Nagle's algorithm
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _release(self, conn, reuse=True):
+        if reuse:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    # ===================================================================
+    # send a request and read the full response body.
+    # idempotent requests are retried with exponential backoff on transient
+    # errors. any request is sent again if it failed on a reused keep-alive
+    # connection the server had already closed (see _stale), or if no
+    # connection could be opened (refused, connect timeout), with backoff
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                conn, reused = self._acquire()
+            except TRANSIENT_ERRORS:
+                # nothing was sent, safe to retry for every method
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+                continue
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+            except TRANSIENT_ERRORS as e:
+                self._release(conn, reuse=False)
+                if reused and _stale(e, sent) and _replayable(body):
+                    continue  # stale idle socket, try again on a fresh one
+                if not idempotent or attempt >= self.retries:
+                    raise
+            except Exception:
+                self._release(conn, reuse=False)
+                raise
+            else:
+                # the server may ask to close the connection after this response
+                self._release(conn, reuse=not response.will_close)
+                if not (idempotent and response.status in TRANSIENT_STATUSES and attempt < self.retries):
+                    return HttpResponse(response.status, response.reason, response.headers, data)
+
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    # open a request and hand back the raw http.client response so the body
+    # can be read in chunks. the connection goes back to the pool only if
+    # the body was read to the end. like request(), a request that failed on
+    # a stale keep-alive socket is sent again on a fresh one and a failed
+    # connect is retried with backoff, nothing else is retried (part of the
+    # body may already have been handed out)
+    @contextmanager
+    def stream(self, method, path, body=None, headers=None):
+        attempt = 0
+        while True:
+            try:
+                conn, reused = self._acquire()
+            except TRANSIENT_ERRORS:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+                continue
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=dict(headers or {}))
+                sent = True
+                response = conn.getresponse()
+                break
+            except TRANSIENT_ERRORS as e:
+                self._release(conn, reuse=False)
+                if not (reused and _stale(e, sent) and _replayable(body)):
+                    raise
+            except Exception:
+                self._release(conn, reuse=False)
+                raise
+        try:
+            yield response
+        except BaseException:
+            self._release(conn, reuse=False)
+            raise
+        self._release(conn, reuse=response.isclosed() and not response.will_close)
+
+    def get_json(self, path):
+        return self.request('GET', path).raise_for_status().json()
+
+    # (key, value) of a JSON object response, parsed while the body is read
+    # (see json_codec.iter_object), for /history and /object_info
+    def iter_json(self, path, keys=None):
+        with self.stream('GET', path) as response:
+            if response.status >= 400:
+                raise HttpError(response.status, response.reason, response.read())
+            yield from json_codec.iter_object(response, keys)
+            response.read()  # trailing whitespace, so the connection can be reused
+
+    def post_json(self, path, payload):
+        json_payload = payload if isinstance(payload, (bytes, bytearray)) else json.dumps(payload).encode('utf-8')
+        req_headers = {'Content-Type': 'application/json'}
+        return self.request('POST', path, body=json_payload, headers=req_headers)
+
+    # ===================================================================
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+# True if the request failed on a socket the server had closed before
+# reading it: the send failed, or the server hung up without sending a
+# single response byte. the request was never processed, so even a POST
+# can go again. a timeout or a cut-off response may come after the server
+# processed it (a POST /prompt would be queued twice), those never are
+def _stale(error, sent):
+    if not sent:
+        return isinstance(error, SEND_ERRORS)
+    return isinstance(error, client.RemoteDisconnected)
+
+# True if body can be sent a second time: bytes, or an iterable that
+# starts over on every iter() (uploads.MultipartEncoder). a file or a
+# generator is consumed by the first attempt
+def _replayable(body):
+    if body is None or isinstance(body, (bytes, bytearray, memoryview, str)):
+        return True
+    try:
+        return iter(body) is not body
+    except TypeError:
+        return False
+
+# =======================================================================
+# one shared client per server_address (and options, so a bigger pool is a
+# pool of its own), every caller in the process reuses the same keep-alive
+# connections
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(server_address, **options):
+    key = (server_address, tuple(sorted(options.items())))
+    with _clients_lock:
+        http = _clients.get(key)
+        if http is None:
+            http = HttpClient(server_address, **options)
+            _clients[key] = http
+        return http
+
+def close_clients():
+    with _clients_lock:
+        for http in _clients.values():
+            http.close()
+        _clients.clear()
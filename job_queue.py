@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from batch_submit import submit_batch
+from sweep import queue_remaining
+
+# =======================================================================
+# one job held by the client side queue.
+# state: pending -> submitted, or cancelled / failed
+class Job:
+    def __init__(self, job_id, variant, priority):
+        self.id = job_id
+        self.variant = variant
+        self.priority = priority
+        self.state = "pending"
+        self.prompt_id = None
+        self.error = None
+        self.entry = None  # its live heap entry
+
+    def __repr__(self):
+        return f"Job({self.id!r}, priority={self.priority}, state={self.state})"
+
+# =======================================================================
+# client side priority queue that keeps the server queue short.
+# jobs wait here and are only sent to /prompt while the server has fewer
+# than low_watermark prompts running or pending, using queue_remaining from
+# the websocket status messages (attach()) or from polling (run()).
+# the server's /queue stays small, and since pending jobs never left the
+# client, cancel() and reprioritize() are just local bookkeeping.
+# higher priority is submitted first, equal priorities in FIFO order.
+# put() and reprioritize() top the server up right away, an idle server
+# sends no status message that would do it.
+# variants are workflow dicts or encoded /prompt bodies (see batch_submit)
+class JobQueue:
+    def __init__(self, server_address, client_id, low_watermark=2, concurrency=4, on_submit=None):
+        self.server_address = server_address
+        self.client_id = client_id
+        self.low_watermark = low_watermark
+        self.concurrency = concurrency
+        self.on_submit = on_submit  # on_submit(job), called after a job was queued (or failed)
+        self.jobs = {}  # job_id -> Job
+        self.queue_remaining = None  # unknown until the first status message
+        self._updates = 0  # queue_remaining values from the server so far
+        self._heap = []  # [-priority, sequence, job], job None once the entry is removed
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._submitting = threading.Lock()
+
+    def __len__(self):
+        return self._pending
+
+    # ===================================================================
+    def put(self, variant, priority=0, job_id=None):
+        with self._lock:
+            sequence = next(self._sequence)
+            job = Job(job_id if job_id is not None else sequence, variant, priority)
+            if job.id in self.jobs and self.jobs[job.id].state == "pending":
+                raise KeyError(f"job {job.id!r} is already queued")
+            self.jobs[job.id] = job
+            self._push(job, sequence)
+            self._pending += 1
+        self.top_up()
+        return job
+
+    # returns False if the job already left the client (or is unknown)
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != "pending":
+                return False
+            job.state = "cancelled"
+            self._remove(job)
+            self._pending -= 1
+        return True
+
+    def reprioritize(self, job_id, priority):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != "pending":
+                return False
+            # a fresh entry, the old one stays in the heap marked as removed
+            self._remove(job)
+            job.priority = priority
+            self._push(job, next(self._sequence))
+        self.top_up()
+        return True
+
+    # pending jobs in the order they will be submitted
+    def pending(self):
+        with self._lock:
+            return [job for _, _, job in sorted(self._heap, key=lambda entry: entry[:2]) if job is not None]
+
+    # heap entries are only marked removed (lazy deletion), _pop skips them
+    def _push(self, job, sequence):
+        job.entry = [-job.priority, sequence, job]
+        heapq.heappush(self._heap, job.entry)
+
+    @staticmethod
+    def _remove(job):
+        job.entry[2] = None
+        job.entry = None
+
+    def _pop(self, count):
+        jobs = []
+        with self._lock:
+            while self._heap and len(jobs) < count:
+                _, _, job = heapq.heappop(self._heap)
+                if job is not None:
+                    job.state = "submitted"
+                    job.entry = None
+                    jobs.append(job)
+            self._pending -= len(jobs)
+        return jobs
+
+    # ===================================================================
+    # send jobs until the server queue is back at the watermark, returns
+    # the number of jobs submitted
+    def top_up(self):
+        # one top up at a time, the next status message will trigger another
+        if not self._submitting.acquire(blocking=False):
+            return 0
+        try:
+            if self.queue_remaining is None:
+                self.queue_remaining = queue_remaining(self.server_address)
+            jobs = self._pop(self.low_watermark - self.queue_remaining)
+            if not jobs:
+                return 0
+
+            # counted before the blocking submits, a status message that
+            # arrives meanwhile replaces the estimate with the server's count
+            self.queue_remaining += len(jobs)
+            updates = self._updates
+            result = submit_batch((job.variant for job in jobs), self.server_address, self.client_id,
+                                  concurrency=self.concurrency)
+            for index, job in enumerate(jobs):
+                if index in result.errors:
+                    job.state = "failed"
+                    job.error = result.errors[index]
+                else:
+                    job.prompt_id = result.prompt_ids[index]
+                job.variant = None  # the body is on the server now
+                if self.on_submit is not None:
+                    self.on_submit(job)
+            if self._updates == updates:
+                self.queue_remaining -= len(result.errors)
+            return len(jobs)
+        finally:
+            self._submitting.release()
+
+    def handle(self, message_type, data):
+        if message_type != "status":
+            return
+        queue_remaining = data.get("status", {}).get("exec_info", {}).get("queue_remaining")
+        if queue_remaining is not None:
+            self.queue_remaining = queue_remaining
+            self._updates += 1
+            self.top_up()
+
+    # top up on every status message of a ws_events.EventClient.
+    # submission is blocking HTTP, so it runs in the default executor
+    def attach(self, ws_client):
+        async def on_status(event):
+            await asyncio.get_running_loop().run_in_executor(None, self.handle, event.type, event.data)
+        ws_client.on("status", on_status)
+        return self
+
+    # without a websocket: poll GET /prompt until every job was submitted
+    def run(self, poll_interval=1.0):
+        while len(self):
+            self.queue_remaining = queue_remaining(self.server_address)
+            self._updates += 1
+            if not self.top_up():
+                time.sleep(poll_interval)
@@ -0,0 +1,157 @@
+import codecs
+import io
+import json
+import re
+
+# =======================================================================
+# JSON backend: orjson when it is installed (parses bytes directly, without
+# decoding them to a str first, and is several times faster), the stdlib
+# json module otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "json" if orjson is None else "orjson"
+
+def loads(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN / Infinity, which json.dumps writes for float("inf") min/max values
+    return json.loads(data)
+
+# compact JSON as bytes
+def dumps(value):
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+# =======================================================================
+# incremental parsing of a top-level JSON object, e.g. /history (prompt_id
+# -> entry) or /object_info (class -> schema), from a binary stream such as
+# an http.client response or a file. the body is decoded chunk by chunk and
+# members are parsed one at a time with the stdlib's C scanner (orjson has
+# no incremental API), so only about one chunk is in memory instead of the
+# raw body, the decoded str and the whole object tree at once
+CHUNK_SIZE = 64 * 1024
+
+_DECODER = json.JSONDecoder()
+_NOT_WHITESPACE = re.compile(r'[^ \t\n\r]')
+# characters that can follow a complete value
+_DELIMITERS = frozenset(' \t\n\r,:}]')
+
+class _Reader:
+    def __init__(self, stream, chunk_size):
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            stream = io.BytesIO(stream)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    # read (at least) size more bytes, False at the end of the stream
+    def _fill(self, size):
+        if self.eof:
+            return False
+        chunk = self.stream.read(size)
+        # drop what has been consumed, the buffer holds about one chunk
+        self.text = self.text[self.pos:] + self.decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    # next non-whitespace character, consumed
+    def token(self):
+        while True:
+            match = _NOT_WHITESPACE.search(self.text, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return match.group()
+            self.pos = len(self.text)
+            if not self._fill(self.chunk_size):
+                raise ValueError("truncated JSON document")
+
+    def expect(self, char):
+        token = self.token()
+        if token != char:
+            raise ValueError(f"expected '{char}', got '{token}'")
+
+    # the value whose first character token() just returned, decoded.
+    # a number or literal cut by the end of the buffer still decodes ("12."
+    # as 12), so a value is only taken once a delimiter follows it in the
+    # buffer, or at the end of the stream. reads grow while a member doesn't
+    # fit, so a huge one isn't rescanned per chunk
+    def value(self):
+        self.pos -= 1
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+                if self.eof or (end < len(self.text) and self.text[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"invalid or truncated JSON document: {e.msg}") from e
+            self._fill(size)
+            size *= 2
+
+# (key, value) of every member of the top-level object in stream (a binary
+# file-like object or bytes), parsed one member at a time.
+# with keys, only those members are returned
+def iter_object(stream, keys=None, chunk_size=CHUNK_SIZE):
+    reader = _Reader(stream, chunk_size)
+    reader.expect('{')
+    token = reader.token()
+    if token == '}':
+        return
+    while True:
+        if token != '"':
+            raise ValueError(f"expected a key, got '{token}'")
+        key = reader.value()
+        reader.expect(':')
+        reader.token()
+        value = reader.value()
+        if keys is None or key in keys:
+            yield key, value
+        token = reader.token()
+        if token == '}':
+            return
+        if token != ',':
+            raise ValueError(f"expected ',' or '}}', got '{token}'")
+        token = reader.token()
+
+# =======================================================================
+# field extraction: the values at a dotted path, "*" matches every member
+# of an object or item of a list, e.g. the output filenames of an entry
+#   list(select(entry, "outputs.*.images.*.filename"))
+def select(value, path):
+    parts = path.split('.') if isinstance(path, str) else path
+    if not parts:
+        yield value
+        return
+    part, rest = parts[0], parts[1:]
+    if part == '*':
+        children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+        for child in children:
+            yield from select(child, rest)
+    elif isinstance(value, dict):
+        if part in value:
+            yield from select(value[part], rest)
+    elif isinstance(value, list) and part.lstrip('-').isdigit():
+        index = int(part)
+        if -len(value) <= index < len(value):
+            yield from select(value[index], rest)
+
+# (key, {path: [values]}) for every member of the top-level object, only the
+# requested fields are kept and each member is dropped as soon as it is read
+def iter_fields(stream, paths, keys=None, chunk_size=CHUNK_SIZE):
+    for key, value in iter_object(stream, keys, chunk_size):
+        yield key, {path: list(select(value, path)) for path in paths}
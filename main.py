@@ -5,7 +5,8 @@ import uuid
 from terminalcolors import tcolor, color_text
 import queue_loader
 import ws_ops_menu
-import ws_ops_menu2_wip
+# import scheduler
+# import sweep
 
 # server_address = "127.0.0.1:8188"  # local
 # server_address = "192.168.0.44:8188"  # (remote-lan windows)
@@ -19,6 +20,17 @@ ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id), timeout=1
 
 # load up the queue with some prompts and return a list of their prompt IDss
 prompt_id_list = queue_loader.run(server_address, client_id)
+# or spread them over several servers (least loaded first)
+# sched = scheduler.Scheduler(["192.168.0.37:8188", "192.168.86.218:8188"])
+# sched.start()
+# prompt_id_list = queue_loader.run(server_address, client_id, scheduler=sched)
+# or sweep parameters, never more than 8 prompts waiting on the server
+# sw = sweep.Sweep(json.load(open('workflow_api.json')), {
+#     "cfg": ("KSampler", "cfg", [5, 7, 9], float),
+#     "sampler": ("KSampler", "sampler_name", ["euler", "dpmpp_2m"]),
+#     "seed": ("KSampler", "seed", range(100)),
+# })
+# prompt_id_list = sweep.submit_sweep(sw, server_address, client_id, max_queue=8).prompt_ids
 
 print(color_text("Prompts Queued", tcolor.GREEN))
 # liste the prompt IDS
@@ -28,6 +40,5 @@ if prompt_id_list is not None:
 
 # run menu
 ws_ops_menu.run(ws, server_address)
-# ws_ops_menu2_wip.run(ws, server_address)
 
 ws.close()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import threading
+import time
+from http_client import get_client
+from terminalcolors import tcolor, color_text
+from history_store import completed_at
+
+# =======================================================================
+# one queue or history item as seen by the selection predicates.
+# location is "running", "pending" or "history"; status is the history
+# status_str ("success", "error", None on older servers) or the location
+# for queued items; completed_at is None for queued items
+class Item:
+    def __init__(self, prompt_id, queue_number, client_id, location, status=None, completed_at=None):
+        self.prompt_id = prompt_id
+        self.queue_number = queue_number
+        self.client_id = client_id
+        self.location = location
+        self.status = location if location != "history" else status
+        self.completed_at = completed_at
+
+    @property
+    def age(self):
+        return None if self.completed_at is None else time.time() - self.completed_at
+
+    def __repr__(self):
+        return f"Item({self.prompt_id!r}, {self.location}, status={self.status})"
+
+# =======================================================================
+# predicates, combine them with all_of()
+def by_client(*client_ids):
+    return lambda item: item.client_id in client_ids
+
+def older_than(seconds):
+    predicate = lambda item: item.age is not None and item.age > seconds
+    predicate.needs_age = True
+    return predicate
+
+def with_status(*statuses):
+    return lambda item: item.status in statuses
+
+def all_of(*predicates):
+    combined = lambda item: all(predicate(item) for predicate in predicates)
+    combined.needs_age = any(getattr(predicate, 'needs_age', False) for predicate in predicates)
+    return combined
+
+# an age based selection on a server whose history has no completion
+# timestamps (older servers) would silently select nothing: fails, or only
+# warns when the selection has another criterion (prune's keep)
+def _check_ages(items, warn=False):
+    if items and all(item.completed_at is None for item, _ in items):
+        message = ("no history entry has a completion timestamp (older server), selecting by age "
+                   "needs an archive (HistoryStore) that has seen the prompts")
+        if not warn:
+            raise ValueError(message)
+        print(color_text(f"Warning: {message}, max_age is ignored", tcolor.YELLOW))
+
+# =======================================================================
+def queue_items(server_address):
+    queue = get_client(server_address).get_json('/queue')
+    items = []
+    for location in ("running", "pending"):
+        for task in queue.get(f"queue_{location}", []):
+            items.append(Item(task[1], task[0], task[3].get("client_id"), location))
+    return items
+
+# (Item, entry) for every history entry, oldest first. entries without a
+# completion timestamp take the one recorded in archive (a HistoryStore)
+def history_items(server_address, history=None, archive=None):
+    entries = history.items() if history is not None else get_client(server_address).iter_json('/history')
+    items = []
+    for prompt_id, entry in entries:
+        queue_number, _, _, extra_data = entry["prompt"][:4]
+        status = (entry.get("status") or {}).get("status_str")
+        items.append((Item(prompt_id, queue_number, extra_data.get("client_id"), "history", status,
+                           completed_at(entry, None)), entry))
+    items.sort(key=lambda pair: pair[0].queue_number)
+    if archive is not None:
+        missing = {item.prompt_id: item for item, _ in items if item.completed_at is None}
+        for prompt_id, finished_at in archive.completion_times(missing).items():
+            missing[prompt_id].completed_at = finished_at
+    return items
+
+# POST {"delete": [...]} to /queue or /history, batch_size ids per request
+def _delete(server_address, path, prompt_ids, batch_size):
+    http = get_client(server_address)
+    for start in range(0, len(prompt_ids), batch_size):
+        http.post_json(path, {"delete": prompt_ids[start:start + batch_size]}).raise_for_status()
+
+# =======================================================================
+# delete every pending prompt matching predicate, in batched requests.
+# a matching running prompt is interrupted when interrupt_running is set
+# (/interrupt stops whatever is running, so it is checked right before).
+# returns the matching items
+def cancel_queued(server_address, predicate, batch_size=100, interrupt_running=False):
+    items = [item for item in queue_items(server_address) if predicate(item)]
+    pending = [item.prompt_id for item in items if item.location == "pending"]
+    _delete(server_address, '/queue', pending, batch_size)
+
+    running = [item for item in items if item.location == "running"]
+    if interrupt_running and running:
+        still_running = {item.prompt_id for item in queue_items(server_address) if item.location == "running"}
+        if running[0].prompt_id in still_running:
+            get_client(server_address).request('POST', '/interrupt', headers={'Content-Type': 'application/json'}).raise_for_status()
+    return items
+
+# delete every history entry matching predicate, in batched requests.
+# with an archive (history_store.HistoryStore) entries are stored there
+# first, and an entry that couldn't be archived is not deleted
+def delete_history(server_address, predicate, batch_size=100, archive=None, history=None):
+    items = history_items(server_address, history, archive)
+    if getattr(predicate, 'needs_age', False):
+        _check_ages(items)
+    selected = [(item, entry) for item, entry in items if predicate(item)]
+    return _archive_and_delete(server_address, selected, batch_size, archive)
+
+def _archive_and_delete(server_address, selected, batch_size, archive):
+    deleted = []
+    for item, entry in selected:
+        if archive is not None:
+            try:
+                archive.add_entry(item.prompt_id, entry)
+            except Exception:
+                continue
+        deleted.append(item)
+    _delete(server_address, '/history', [item.prompt_id for item in deleted], batch_size)
+    return deleted
+
+# retention: keep at most `keep` entries (the newest) and nothing older
+# than max_age seconds. returns the deleted items
+def prune_history(server_address, keep=None, max_age=None, batch_size=100, archive=None):
+    items = history_items(server_address, archive=archive)
+    if max_age is not None:
+        _check_ages(items, warn=keep is not None)
+    selected = []
+    for index, (item, entry) in enumerate(items):
+        too_many = keep is not None and index < len(items) - keep
+        too_old = max_age is not None and item.age is not None and item.age > max_age
+        if too_many or too_old:
+            selected.append((item, entry))
+    return _archive_and_delete(server_address, selected, batch_size, archive)
+
+# =======================================================================
+# prunes the server history in the background every `interval` seconds,
+# so /history (and everything that fetches it) stays small on long runs
+class RetentionDaemon:
+    def __init__(self, server_address, keep=None, max_age=None, archive=None, interval=600, batch_size=100):
+        if keep is None and max_age is None:
+            raise ValueError("a retention policy needs keep and/or max_age")
+        self.server_address = server_address
+        self.keep = keep
+        self.max_age = max_age
+        self.archive = archive
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pruned = 0
+        self.runs = 0
+        self.last_error = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def run_once(self):
+        deleted = prune_history(self.server_address, self.keep, self.max_age, self.batch_size, self.archive)
+        self.pruned += len(deleted)
+        self.runs += 1
+        return deleted
+
+    def start(self):
+        self._stop.clear()
+
+        def loop():
+            while True:
+                try:
+                    self.run_once()
+                    self.last_error = None
+                except Exception as e:
+                    # server away, a bad entry, a locked archive database...
+                    # the daemon keeps going and tries again next interval
+                    self.last_error = e
+                    print(color_text(f"History retention on {self.server_address} failed: {e!r}", tcolor.RED))
+                if self._stop.wait(self.interval):
+                    break
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,289 @@
+import bisect
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http_client import get_client, HttpError
+from node_resolver import get_resolver
+
+# prompts remembered as started before they were reported submitted
+STARTED_BACKLOG = 1024
+# submitted prompts waiting for their execution_start, the oldest are
+# forgotten (a prompt that never starts, or no websocket attached)
+SUBMITTED_BACKLOG = 10000
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# =======================================================================
+# minimal Prometheus-style metric types. values are kept per label tuple,
+# updates are a dict lookup plus an add, so they are cheap to call per message
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _label_str(self, key):
+        if not key:
+            return ""
+        pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key))
+        return "{" + pairs + "}"
+
+    # copy of the values, taken under the lock: updates come from other
+    # threads while /metrics is rendered
+    def _items(self):
+        with self._lock:
+            return [(key, list(value) if isinstance(value, list) else value)
+                    for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def lines(self):
+        return [f"{self.name}{self._label_str(k)} {v}" for k, v in self._items()]
+
+    def snapshot(self):
+        return {",".join(k) or "": v for k, v in self._items()}
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # per bucket counts (+Inf last), then sum
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def lines(self):
+        lines = []
+        for key, counts in self._items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = dict(zip(self.labels, key), le=str(bound))
+                label_str = "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in labels.items()) + "}"
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+    def snapshot(self):
+        return {
+            ",".join(k) or "": {"count": sum(c[:-1]), "sum": c[-1]}
+            for k, c in self._items()
+        }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# =======================================================================
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Prometheus text exposition format
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+# =======================================================================
+# ComfyUI metrics fed from the websocket event stream (handle() or attach())
+# plus periodic polling of /system_stats and /queue (start_polling()).
+# serve() exposes /metrics (Prometheus text) and /metrics.json
+class ComfyMetrics:
+    def __init__(self, server_address, registry=None):
+        self.server_address = server_address
+        self.registry = registry or Registry()
+        r = self.registry
+        self.submit_latency = r.add(Histogram("comfyui_submit_latency_seconds", "Time to POST a prompt to /prompt"))
+        self.queue_wait = r.add(Histogram("comfyui_queue_wait_seconds", "Time from submit to execution_start"))
+        self.node_execution = r.add(Histogram("comfyui_node_execution_seconds", "Execution time per node", ("class_type",)))
+        self.prompts_completed = r.add(Counter("comfyui_prompts_completed_total", "Prompts that finished executing"))
+        self.nodes_executed = r.add(Counter("comfyui_nodes_executed_total", "Nodes that were executed"))
+        self.nodes_cached = r.add(Counter("comfyui_nodes_cached_total", "Nodes reused from the cache"))
+        self.cached_ratio = r.add(Gauge("comfyui_cached_node_ratio", "Cached nodes / (cached + executed) nodes"))
+        self.interrupts = r.add(Counter("comfyui_interrupts_total", "Interrupted prompts"))
+        self.steps_per_second = r.add(Gauge("comfyui_steps_per_second", "Sampler steps per second"))
+        self.queue_depth = r.add(Gauge("comfyui_queue_remaining", "Prompts running or pending on the server"))
+        self.vram_free = r.add(Gauge("comfyui_vram_free_bytes", "Free VRAM per device", ("device",)))
+
+        self._submitted = OrderedDict()  # prompt_id -> submit time, oldest first
+        # prompts that started before submitted() was called for them (an
+        # idle server starts a prompt before its /prompt response is read)
+        self._started = OrderedDict()
+        self._lock = threading.Lock()  # submitted() is called from submit worker threads
+        self._node = None  # (prompt_id, node_id, start time)
+        self._last_step = None  # (value, time)
+        self._counts = [0, 0]  # executed, cached
+        self._poller = None
+        self._stop = threading.Event()
+
+    # ===================================================================
+    # call when a prompt was submitted, so its queue wait can be measured
+    def submitted(self, prompt_id, latency=None):
+        with self._lock:
+            started = self._started.pop(prompt_id, None)
+            if started is None:
+                self._submitted[prompt_id] = time.monotonic()
+                while len(self._submitted) > SUBMITTED_BACKLOG:
+                    self._submitted.popitem(last=False)
+        if started is not None:
+            self.queue_wait.observe(0.0)
+        if latency is not None:
+            self.submit_latency.observe(latency)
+
+    def handle(self, message_type, data):
+        now = time.monotonic()
+        if message_type == "executing":
+            self._end_node(now)
+            if data.get("node") is None:
+                self.prompts_completed.inc()
+                self._last_step = None
+            else:
+                self._node = (data.get("prompt_id"), data["node"], now)
+                self._counts[0] += 1
+                self.nodes_executed.inc()
+                self._update_ratio()
+        elif message_type == "progress":
+            value = data["value"]
+            if self._last_step is not None and value > self._last_step[0] and now > self._last_step[1]:
+                self.steps_per_second.set((value - self._last_step[0]) / (now - self._last_step[1]))
+            self._last_step = (value, now)
+        elif message_type == "execution_start":
+            with self._lock:
+                submitted = self._submitted.pop(data.get("prompt_id"), None)
+                if submitted is None and data.get("prompt_id") is not None:
+                    self._started[data["prompt_id"]] = now
+                    while len(self._started) > STARTED_BACKLOG:
+                        self._started.popitem(last=False)
+            if submitted is not None:
+                self.queue_wait.observe(now - submitted)
+        elif message_type == "execution_cached":
+            cached = len(data.get("nodes", []))
+            self._counts[1] += cached
+            self.nodes_cached.inc(cached)
+            self._update_ratio()
+        elif message_type == "status":
+            queue_remaining = data.get("status", {}).get("exec_info", {}).get("queue_remaining")
+            if queue_remaining is not None:
+                self.queue_depth.set(queue_remaining)
+        elif message_type == "execution_interrupted":
+            self._node = None
+            self.interrupts.inc()
+
+    def _end_node(self, now):
+        if self._node is None:
+            return
+        prompt_id, node_id, started = self._node
+        self._node = None
+        # cache only, a metrics update must never wait on an HTTP request
+        class_type = get_resolver(self.server_address).resolve(prompt_id, node_id, fetch=False) if prompt_id else ""
+        self.node_execution.observe(now - started, class_type or "unknown")
+
+    def _update_ratio(self):
+        executed, cached = self._counts
+        if executed + cached:
+            self.cached_ratio.set(cached / (executed + cached))
+
+    def attach(self, ws_client):
+        async def on_event(event):
+            self.handle(event.type, event.data)
+        ws_client.on("*", on_event)
+        return self
+
+    # ===================================================================
+    def poll(self):
+        http = get_client(self.server_address)
+        try:
+            stats = http.get_json('/system_stats')
+            queue = http.get_json('/queue')
+        except (OSError, HttpError):
+            return
+        for device in stats.get("devices", []):
+            self.vram_free.set(device.get("vram_free", 0), device.get("name", str(device.get("index", ""))))
+        self.queue_depth.set(len(queue.get("queue_running", [])) + len(queue.get("queue_pending", [])))
+
+    def start_polling(self, interval=5.0):
+        self._stop.clear()
+
+        def loop():
+            while True:
+                self.poll()
+                if self._stop.wait(interval):
+                    break
+
+        self._poller = threading.Thread(target=loop, daemon=True)
+        self._poller.start()
+
+    def stop_polling(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+    # ===================================================================
+    # serve /metrics and /metrics.json from a background thread, returns the server
+    def serve(self, port=9188, host="127.0.0.1"):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.render().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode('utf-8')
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from http_client import get_client, HttpError
+
+# =======================================================================
+# {node_id: class_type} for a workflow dict (or Workflow)
+def node_classes(prompt_workflow):
+    nodes = getattr(prompt_workflow, 'nodes', prompt_workflow)
+    return {node_id: node.get("class_type", "") for node_id, node in nodes.items()}
+
+# =======================================================================
+# resolves node_id -> class_type for any prompt, cached by prompt_id.
+# graphs are learned at submit time via register(), or fetched once from
+# /history/{prompt_id} (finished) or /queue (running/pending) on a miss.
+# the least recently used prompts are evicted beyond `capacity`
+class NodeClassResolver:
+    def __init__(self, server_address, capacity=256, retry_after=5.0):
+        self.server_address = server_address
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self._cache = OrderedDict()  # prompt_id -> {node_id: class_type}
+        self._missing = {}  # prompt_id -> time of the last failed lookup
+        self._lock = threading.Lock()
+
+    # ===================================================================
+    # remember the graph of a prompt we submitted. classes can be shared
+    # between prompts from the same workflow, the mapping is never modified
+    def register(self, prompt_id, classes):
+        with self._lock:
+            self._cache[prompt_id] = classes
+            self._cache.move_to_end(prompt_id)
+            self._missing.pop(prompt_id, None)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    # with fetch=False only the cache is used, so it never blocks on the network
+    def resolve(self, prompt_id, node_id, fetch=True):
+        with self._lock:
+            classes = self._cache.get(prompt_id)
+            if classes is not None:
+                self._cache.move_to_end(prompt_id)
+                return classes.get(node_id, "")
+            if not fetch:
+                return ""
+            # don't hit the server for every message of an unknown prompt
+            last_failed = self._missing.get(prompt_id)
+            if last_failed is not None and time.monotonic() - last_failed < self.retry_after:
+                return ""
+
+        classes = self._fetch(prompt_id)
+        if classes is None:
+            with self._lock:
+                now = time.monotonic()
+                self._missing[prompt_id] = now
+                if len(self._missing) > self.capacity:
+                    self._missing = {k: t for k, t in self._missing.items() if now - t < self.retry_after}
+            return ""
+        self.register(prompt_id, classes)
+        return classes.get(node_id, "")
+
+    # ===================================================================
+    def _fetch(self, prompt_id):
+        http = get_client(self.server_address)
+        try:
+            history = http.get_json(f'/history/{prompt_id}')
+            if prompt_id in history:
+                return node_classes(history[prompt_id]["prompt"][2])
+
+            queue = http.get_json('/queue')
+            for queue_item in queue.get("queue_running", []) + queue.get("queue_pending", []):
+                if queue_item[1] == prompt_id:
+                    return node_classes(queue_item[2])
+        except (OSError, HttpError, ValueError):
+            pass  # unreachable, or a truncated / non-JSON body: unresolved for now
+        return None
+
+# =======================================================================
+# one shared resolver per server_address
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+def get_resolver(server_address, **options):
+    with _resolvers_lock:
+        resolver = _resolvers.get(server_address)
+        if resolver is None:
+            resolver = NodeClassResolver(server_address, **options)
+            _resolvers[server_address] = resolver
+        return resolver
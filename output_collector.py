@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from urllib import parse
+from http_client import get_client
+
+# =======================================================================
+# downloads outputs as soon as their `executed` message arrives.
+# every image listed in the message is streamed from /view in chunks by a
+# bounded pool of download workers, either to dest_dir (keeping the server's
+# subfolder) or to a callback. nothing goes through PIL unless decode=True.
+#
+#   callback(info, chunks)  - info is the image dict from the message plus
+#                             "prompt_id"/"node", chunks an iterator of bytes
+#   on_image(info, image)   - only with decode=True, gets a PIL image
+#
+# stats["latencies"] keeps the last `latency_samples` download latencies
+# (seconds from the message to the file being written), a long running
+# collector doesn't grow a list per image
+class OutputCollector:
+    def __init__(self, server_address, dest_dir=None, callback=None, workers=4,
+                 chunk_size=64 * 1024, types=("output",), decode=False, on_image=None,
+                 latency_samples=1024):
+        if dest_dir is None and callback is None:
+            raise ValueError("OutputCollector needs a dest_dir or a callback")
+        self.server_address = server_address
+        self.dest_dir = dest_dir
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self.types = set(types)
+        self.decode = decode
+        self.on_image = on_image
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        # downloads in flight, removed as they finish; the exceptions of
+        # failed ones are kept (the most recent 1024) until wait()
+        self._futures = set()
+        self._errors = deque(maxlen=1024)
+        self._lock = threading.Lock()
+        self.stats = {"files": 0, "bytes": 0, "failed": 0,
+                      "latencies": deque(maxlen=latency_samples)}
+
+    # ===================================================================
+    # hook into a ws_events.EventClient
+    def attach(self, ws_client):
+        async def on_executed(event):
+            self.handle(event.data)
+        ws_client.on("executed", on_executed)
+        return self
+
+    # queue downloads for one `executed` message's data, returns right away
+    def handle(self, data):
+        received = time.perf_counter()
+        output = data.get("output") or {}
+        for image in output.get("images", []):
+            if image.get("type", "output") not in self.types:
+                continue
+            info = dict(image, prompt_id=data.get("prompt_id"), node=data.get("node"))
+            future = self._executor.submit(self._run, info, received)
+            with self._lock:
+                self._futures.add(future)
+            future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    # the error is recorded before the future completes, so wait() sees it
+    def _run(self, info, received):
+        try:
+            return self._download(info, received)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(e)
+            raise
+
+    # ===================================================================
+    def _download(self, info, received):
+        params = {"filename": info["filename"], "subfolder": info.get("subfolder", ""), "type": info.get("type", "output")}
+        path = f"/view?{parse.urlencode(params)}"
+        size = 0
+        try:
+            with get_client(self.server_address).stream('GET', path) as response:
+                if response.status != 200:
+                    response.read()
+                    raise OSError(f"/view returned {response.status} for {info['filename']}")
+
+                def chunks():
+                    nonlocal size
+                    while chunk := response.read(self.chunk_size):
+                        size += len(chunk)
+                        yield chunk
+
+                if self.callback is not None:
+                    self.callback(info, chunks())
+                    # drain whatever the callback didn't read so the connection can be reused
+                    for _ in chunks():
+                        pass
+                    saved_path = None
+                else:
+                    saved_path = self._save(info, chunks())
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            raise
+
+        with self._lock:
+            self.stats["files"] += 1
+            self.stats["bytes"] += size
+            self.stats["latencies"].append(time.perf_counter() - received)
+
+        if self.decode and self.on_image is not None and saved_path is not None:
+            from PIL import Image  # only needed when decoding was asked for
+            with Image.open(saved_path) as image:
+                self.on_image(info, image)
+        return saved_path
+
+    # write to a temp file and rename, so a partial file is never visible.
+    # subfolder and filename come from the server, a path that would end up
+    # outside dest_dir (absolute, "..") is refused rather than written
+    def _save(self, info, chunks):
+        root = os.path.abspath(self.dest_dir)
+        folder = os.path.normpath(os.path.join(root, info.get("subfolder") or ""))
+        filename = os.path.basename(info["filename"])
+        if os.path.commonpath([root, folder]) != root or filename in ("", ".", ".."):
+            raise OSError(f"refusing to save {info.get('subfolder')!r}/{info['filename']!r} outside {root}")
+        os.makedirs(folder, exist_ok=True)
+        target = os.path.join(folder, filename)
+        partial = target + ".part"
+        with open(partial, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(partial, target)
+        return target
+
+    # ===================================================================
+    # wait for every queued download, returns the list of exceptions (if any)
+    # of the downloads that failed since the last wait()
+    def wait(self):
+        with self._lock:
+            futures = list(self._futures)
+        wait_futures(futures)
+        with self._lock:
+            errors = list(self._errors)
+            self._errors.clear()
+        return errors
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,143 @@
+import json
+import struct
+import threading
+import time
+from collections import deque
+
+# binary websocket frames start with a big-endian uint32 event type
+PREVIEW_IMAGE = 1
+UNENCODED_PREVIEW_IMAGE = 2
+PREVIEW_IMAGE_WITH_METADATA = 4
+
+# PREVIEW_IMAGE has a second uint32 for the image format
+FORMATS = {1: "JPEG", 2: "PNG"}
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png"}
+
+# =======================================================================
+# one decoded preview. data is a memoryview into the websocket frame, so
+# nothing is copied until a consumer asks for bytes()
+class Preview:
+    def __init__(self, event_type, image_format, data, metadata=None):
+        self.event_type = event_type
+        self.format = image_format  # "JPEG" / "PNG"
+        self.data = data
+        self.metadata = metadata or {}  # prompt_id / node_id on newer servers
+        self.received = time.monotonic()
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+    @property
+    def prompt_id(self):
+        return self.metadata.get("prompt_id")
+
+    def bytes(self):
+        return self.data.tobytes()
+
+    def __repr__(self):
+        return f"Preview({self.format}, {len(self.data)} bytes)"
+
+# =======================================================================
+# decode a binary websocket frame, None for frames that are not previews.
+#   PREVIEW_IMAGE:               type, format, image
+#   PREVIEW_IMAGE_WITH_METADATA: type, metadata length, metadata JSON, image
+#                                (the format comes from metadata["image_type"])
+def parse_frame(payload):
+    view = memoryview(payload)
+    if len(view) < 8:
+        return None
+    event_type, value = struct.unpack_from(">II", view)
+    if event_type == PREVIEW_IMAGE:
+        if value not in FORMATS:
+            return None
+        return Preview(event_type, FORMATS[value], view[8:])
+    if event_type == PREVIEW_IMAGE_WITH_METADATA:
+        end = 8 + value
+        metadata = json.loads(view[8:end].tobytes())
+        mime_type = metadata.get("image_type", "image/jpeg")
+        image_format = next((name for name, mime in MIME_TYPES.items() if mime == mime_type), None)
+        if image_format is None:
+            return None
+        return Preview(event_type, image_format, view[end:], metadata)
+    return None
+
+# =======================================================================
+# bounded ring buffer between the websocket reader and a (maybe slow)
+# preview consumer. put() never blocks: when the buffer is full the oldest
+# frame is dropped, so the reader keeps going and memory stays bounded.
+#   latest_only - keep just the newest frame (capacity 1)
+#   fps         - decimate: accept at most this many frames per second
+# get() blocks the consumer thread until a frame arrives
+class PreviewBuffer:
+    def __init__(self, capacity=8, fps=None, latest_only=False):
+        self.capacity = 1 if latest_only else capacity
+        self.fps = fps
+        self.received = 0
+        self.decimated = 0  # skipped because of fps
+        self.dropped = 0  # pushed out of a full buffer before being consumed
+        self._frames = deque(maxlen=self.capacity)
+        self._last_accepted = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._frames)
+
+    # add a frame (a Preview or a raw binary payload), returns whether it was kept
+    def put(self, frame):
+        if not isinstance(frame, Preview):
+            frame = parse_frame(frame)
+            if frame is None:
+                return False
+        with self._cond:
+            self.received += 1
+            if self.fps and self._last_accepted is not None and frame.received - self._last_accepted < 1 / self.fps:
+                self.decimated += 1
+                return False
+            self._last_accepted = frame.received
+            if len(self._frames) == self.capacity:
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+        return True
+
+    # the oldest buffered frame, waiting up to timeout (None = forever).
+    # returns None on timeout or after close()
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames or self._closed, timeout):
+                return None
+            return self._frames.popleft() if self._frames else None
+
+    # the newest frame, discarding older ones (for "show the current preview")
+    def latest(self):
+        with self._cond:
+            if not self._frames:
+                return None
+            frame = self._frames.pop()
+            self.dropped += len(self._frames)
+            self._frames.clear()
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def stats(self):
+        return {"received": self.received, "decimated": self.decimated, "dropped": self.dropped,
+                "buffered": len(self._frames)}
+
+    # feed from a ws_events.EventClient
+    def attach(self, ws_client):
+        async def on_preview(payload):
+            self.put(payload)
+        ws_client.on_preview(on_preview)
+        return self
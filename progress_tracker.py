@@ -0,0 +1,215 @@
+import time
+
+# =======================================================================
+# timing of one node execution inside a prompt
+class NodeTiming:
+    def __init__(self, node_id, started):
+        self.node_id = node_id
+        self.started = started
+        self.finished = None
+        self.value = 0
+        self.max = 0
+
+    @property
+    def duration(self):
+        return (self.finished or time.monotonic()) - self.started
+
+# =======================================================================
+# lifecycle of one prompt: queued -> running -> done
+class PromptProgress:
+    def __init__(self, prompt_id, queued_at=None):
+        self.prompt_id = prompt_id
+        self.state = "queued"
+        self.queued_at = queued_at
+        self.started_at = None
+        self.finished_at = None
+        self.current_node = None
+        self.cached_nodes = []
+        self.nodes = {}  # node_id -> NodeTiming, in execution order
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self):
+        return {
+            "prompt_id": self.prompt_id,
+            "state": self.state,
+            "current_node": self.current_node,
+            "cached_nodes": list(self.cached_nodes),
+            "duration_s": self.duration,
+            "nodes": {
+                node_id: {"duration_s": t.duration, "value": t.value, "max": t.max}
+                for node_id, t in self.nodes.items()
+            },
+        }
+
+# =======================================================================
+# models every prompt's lifecycle from websocket messages and derives rates:
+# steps/sec (smoothed), per-prompt ETA and whole-queue ETA.
+# feed it with handle(type, data) (raw messages) or attach() it to a
+# ws_events.EventClient. snapshot() returns everything as plain data.
+# on_slow(rate) is called when the step rate drops below min_step_rate
+class ProgressTracker:
+    def __init__(self, smoothing=0.2, min_step_rate=None, on_slow=None, history=256):
+        self.smoothing = smoothing
+        self.min_step_rate = min_step_rate
+        self.on_slow = on_slow
+        self.history = history
+        self.prompts = {}  # prompt_id -> PromptProgress
+        self.current = None  # PromptProgress being executed
+        self.queue_remaining = 0
+        self.step_rate = None  # steps/sec, exponential moving average
+        self.prompt_duration = None  # seconds per prompt, exponential moving average
+        self._last_step = None  # (node_id, value, time) of the last progress message
+
+    # ===================================================================
+    # remember a prompt at submit time so it shows up as queued
+    def track(self, prompt_id):
+        self.prompts.setdefault(prompt_id, PromptProgress(prompt_id, time.monotonic()))
+
+    def _prompt(self, prompt_id):
+        if prompt_id is None:
+            return self.current
+        if prompt_id not in self.prompts:
+            self.prompts[prompt_id] = PromptProgress(prompt_id)
+        return self.prompts[prompt_id]
+
+    def _start(self, prompt):
+        if prompt.state == "queued":
+            prompt.state = "running"
+            prompt.started_at = time.monotonic()
+        self.current = prompt
+
+    def _finish(self, prompt):
+        now = time.monotonic()
+        if prompt.current_node is not None:
+            prompt.nodes[prompt.current_node].finished = now
+        prompt.current_node = None
+        prompt.state = "done"
+        prompt.finished_at = now
+        if prompt.started_at is not None:
+            self.prompt_duration = self._smooth(self.prompt_duration, now - prompt.started_at)
+        if self.current is prompt:
+            self.current = None
+        self._last_step = None
+        self._forget_old()
+
+    def _smooth(self, average, sample):
+        return sample if average is None else average + self.smoothing * (sample - average)
+
+    # keep memory bounded on long runs by dropping the oldest finished prompts
+    def _forget_old(self):
+        if len(self.prompts) <= self.history:
+            return
+        for prompt_id in [p.prompt_id for p in self.prompts.values() if p.state == "done"][:len(self.prompts) - self.history]:
+            del self.prompts[prompt_id]
+
+    # ===================================================================
+    def handle(self, message_type, data):
+        if message_type == "status":
+            queue_remaining = data.get("status", {}).get("exec_info", {}).get("queue_remaining")
+            if queue_remaining is not None:
+                self.queue_remaining = queue_remaining
+
+        elif message_type == "execution_start":
+            self._start(self._prompt(data.get("prompt_id")))
+
+        elif message_type == "execution_cached":
+            prompt = self._prompt(data.get("prompt_id"))
+            if prompt is not None:
+                self._start(prompt)
+                prompt.cached_nodes.extend(data.get("nodes", []))
+
+        elif message_type == "executing":
+            prompt = self._prompt(data.get("prompt_id"))
+            if prompt is None:
+                return
+            node_id = data.get("node")
+            if node_id is None:
+                self._finish(prompt)
+                return
+            self._start(prompt)
+            now = time.monotonic()
+            if prompt.current_node is not None:
+                prompt.nodes[prompt.current_node].finished = now
+            prompt.current_node = node_id
+            prompt.nodes[node_id] = NodeTiming(node_id, now)
+            self._last_step = None
+
+        elif message_type == "progress":
+            prompt = self._prompt(data.get("prompt_id"))
+            if prompt is None or prompt.current_node is None:
+                return
+            node_id = data.get("node", prompt.current_node)
+            timing = prompt.nodes.get(node_id)
+            if timing is None:
+                return
+            timing.value = data["value"]
+            timing.max = data["max"]
+            self._measure_step(node_id, data["value"])
+
+    def _measure_step(self, node_id, value):
+        now = time.monotonic()
+        if self._last_step is not None:
+            last_node, last_value, last_time = self._last_step
+            steps = value - last_value
+            if last_node == node_id and steps > 0 and now > last_time:
+                self.step_rate = self._smooth(self.step_rate, steps / (now - last_time))
+                if self.min_step_rate is not None and self.on_slow is not None and self.step_rate < self.min_step_rate:
+                    self.on_slow(self.step_rate)
+        self._last_step = (node_id, value, now)
+
+    def attach(self, ws_client):
+        async def on_event(event):
+            self.handle(event.type, event.data)
+        ws_client.on("*", on_event)
+        return self
+
+    # ===================================================================
+    # seconds until a prompt is done (None if there is nothing to go on yet)
+    def prompt_eta(self, prompt_id=None):
+        prompt = self._prompt(prompt_id)
+        if prompt is None or prompt.state == "done":
+            return 0.0 if prompt is not None else None
+        if prompt.state == "queued":
+            return self.prompt_duration
+
+        # sampling: remaining steps at the measured rate, and at least what
+        # the average prompt says is left
+        estimates = []
+        timing = prompt.nodes.get(prompt.current_node)
+        if timing is not None and timing.max and self.step_rate:
+            estimates.append((timing.max - timing.value) / self.step_rate)
+        if self.prompt_duration is not None:
+            estimates.append(self.prompt_duration - prompt.duration)
+        return max(0.0, max(estimates)) if estimates else None
+
+    # seconds until the whole server queue is drained
+    def queue_eta(self):
+        if self.prompt_duration is None:
+            return None
+        current_eta = self.prompt_eta() or 0.0
+        waiting = self.queue_remaining - (1 if self.current is not None else 0)
+        return current_eta + max(0, waiting) * self.prompt_duration
+
+    def snapshot(self):
+        return {
+            "queue_remaining": self.queue_remaining,
+            "step_rate": self.step_rate,
+            "prompt_duration_s": self.prompt_duration,
+            "current_prompt": self.current.prompt_id if self.current else None,
+            "prompt_eta_s": self.prompt_eta() if self.current else None,
+            "queue_eta_s": self.queue_eta(),
+            "prompts": [p.as_dict() for p in self.prompts.values()],
+        }
+
+# =======================================================================
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
@@ -1,24 +1,48 @@
 import json
 import random
-from urllib import request
+import time
 from terminalcolors import tcolor, color_text
+from batch_submit import submit_batch
+from batch_planner import BatchPlan
+from http_client import get_client
+from workflow import Workflow
+from workflow_template import WorkflowTemplate
+from node_resolver import get_resolver, node_classes
+from schema_registry import get_registry
 
 # =======================================================================
-# call the /prompt endpoint (POST), add a job to the queue
-def queue_prompt(prompt_workflow, server_address, client_id):
+# encode a /prompt request body. the result is a snapshot, so the workflow
+# dict can be modified afterwards without affecting the encoded payload
+def build_payload(prompt_workflow, client_id):
     request_payload = {"prompt": prompt_workflow, "client_id": client_id}
-    json_payload = json.dumps(request_payload).encode('utf-8')
-    url = "http://{}/prompt".format(server_address)
-    req_headers = {'Content-Type': 'application/json'}
-    prompt_req = request.Request(url, data=json_payload, headers=req_headers, method='POST')
-    # send request and get the response
-    with request.urlopen(prompt_req) as response:
-        response_content = response.read()
-        return json.loads(response_content) # return response content
+    return json.dumps(request_payload).encode('utf-8')
+
+# =======================================================================
+# call the /prompt endpoint (POST), add a job to the queue
+# with validate=True the workflow is checked against the server's cached
+# node schemas first, and a bad one raises WorkflowValidationError locally.
+# with metrics (a metrics.ComfyMetrics) the submission is recorded
+def queue_prompt(prompt_workflow, server_address, client_id, validate=False, metrics=None):
+    if validate:
+        get_registry(server_address).check(prompt_workflow)
+    json_payload = build_payload(prompt_workflow, client_id)
+    # send request over the shared keep-alive client and get the response
+    start = time.perf_counter()
+    response = get_client(server_address).post_json('/prompt', json_payload)
+    response_content = response.raise_for_status().json()
+    if metrics is not None:
+        metrics.submitted(response_content['prompt_id'], time.perf_counter() - start)
+    # remember the graph so progress messages can resolve node classes
+    get_resolver(server_address).register(response_content['prompt_id'], node_classes(prompt_workflow))
+    return response_content # return response content
 
 # =======================================================================
 # get a node via its title
 def get_node(prompt_workflow, title):
+    # indexed lookup when given a Workflow
+    if isinstance(prompt_workflow, Workflow):
+        return prompt_workflow.node(title)
+
     # find node by title (case-insensitive)
     lower_title = title.lower()
 
@@ -33,10 +57,13 @@ def get_node(prompt_workflow, title):
 
 # =======================================================================
 # main function
-def run(server_address, client_id):
+# pass a scheduler.Scheduler to spread the jobs over several servers.
+# with reorder=True jobs are submitted in the order that reuses the most of
+# ComfyUI's cache (batch_planner), prompt_ids still come back in list order
+def run(server_address, client_id, concurrency=4, scheduler=None, reorder=False, metrics=None):
 
-    # Load workflow API data from file
-    prompt_workflow = json.load(open('workflow_api.json'))
+    # Load workflow API data from file, indexed by title/class/id
+    prompt_workflow = Workflow.load('workflow_api.json')
 
     # list of positive prompts
     prompt_list = [
@@ -53,10 +80,7 @@ def run(server_address, client_id):
 
     # Retrieve nodes from workflow
     chkpoint_loader_node = get_node(prompt_workflow, 'Load Checkpoint')
-    prompt_pos_node = get_node(prompt_workflow, 'Pos Prompt')
     empty_latent_img_node = get_node(prompt_workflow, 'Empty Latent Image')
-    ksampler_node = get_node(prompt_workflow, 'KSampler')
-    save_image_node = get_node(prompt_workflow, 'Save Image')
     load_image_node = get_node(prompt_workflow, 'Load Image')
     load_imagemask_node = get_node(prompt_workflow, 'Load Image (as Mask)')
 
@@ -70,24 +94,58 @@ def run(server_address, client_id):
     empty_latent_img_node["inputs"]["height"] = 640
     empty_latent_img_node["inputs"]["batch_size"] = 6
 
-    # store prompt id for each job when added to queue
-    prompt_id_list = []
+    # compile the workflow once, only these inputs change between jobs
+    template = WorkflowTemplate(prompt_workflow, {
+        "text": ('Pos Prompt', 'text'),
+        "seed": ('KSampler', 'seed'),
+        "steps": ('KSampler', 'steps'),
+        "filename_prefix": ('Save Image', 'filename_prefix'),
+    })
+
+    # encoded request body for each job, built lazily as the batch is submitted
+    def payloads():
+        for prompt in prompt_list:
+            yield template.render(
+                client_id,
+                text=prompt,
+                seed=random.randint(1, 18446744073709551614),
+                steps=60,  # high steps to slow things down a bit
+                filename_prefix=prompt[:100],
+            )
+
+    variants = payloads()
+    plan = None
+    if reorder:
+        plan = BatchPlan(variants)
+        variants = plan.variants
+        report = plan.report()
+        print(color_text(f"Reordered for cache reuse: predicted hit rate {report['baseline_hit_rate']:.0%} -> "
+                         f"{report['predicted_hit_rate']:.0%}, model loads {report['baseline_reloads']} -> "
+                         f"{report['predicted_reloads']}", tcolor.BRIGHT_BLACK))
+
+    # add all jobs to the queue in parallel, prompt_ids come back in submission order
+    if scheduler is not None:
+        result = scheduler.submit_batch(variants, client_id, concurrency=concurrency, metrics=metrics)
+    else:
+        result = submit_batch(variants, server_address, client_id, concurrency=concurrency, metrics=metrics)
+    if plan is not None:
+        plan.track(result.prompt_ids)
+        result = plan.restore(result)
 
-    # Process each prompt
-    for index, prompt in enumerate(prompt_list):
-        prompt_pos_node["inputs"]["text"] = prompt
-        ksampler_node["inputs"]["seed"] = random.randint(1, 18446744073709551614)
-        # high steps to slow things down a bit
-        ksampler_node["inputs"]["steps"] = 60
-        file_prefix = prompt[:100]
-        save_image_node["inputs"]["filename_prefix"] = file_prefix
+    # every job has the same graph, so they share one node class mapping
+    classes = node_classes(prompt_workflow)
+    for pid in result.prompt_ids:
+        if pid is not None:
+            target = scheduler.backend_of(pid) if scheduler is not None else server_address
+            get_resolver(target).register(pid, classes)
 
-        # everything set, add entire prompt/workflow to queue, get response
-        response = queue_prompt(prompt_workflow, server_address, client_id)
+    for index, e in result.errors.items():
+        print(color_text(f"Failed to queue prompt {index}: {e}", tcolor.RED))
 
-        # extract the prompt_id from the response and add to list
-        pid = response['prompt_id']
-        prompt_id_list.append(pid)
+    stats = result.stats
+    print(color_text(f"Queued {stats['submitted']}/{stats['total']} prompts, "
+                     f"{stats['submissions_per_sec']:.1f}/s "
+                     f"(p50 {stats['p50_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms)", tcolor.BRIGHT_BLACK))
 
-    # return the list of prompt_ids
-    return prompt_id_list
+    # return the list of prompt_ids (None for prompts that failed to queue)
+    return result.prompt_ids
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from http_client import get_client
+from queue_loader import queue_prompt
+from workflow import Workflow, graph_hash
+
+# =======================================================================
+# content addressed cache in front of queue_prompt: a workflow whose graph
+# hash was already executed returns the existing prompt_id and outputs
+# instead of running again on the GPU, and duplicates of a prompt that is
+# still queued or running are merged onto its prompt_id.
+# finished prompts are kept in an LRU of `capacity` hashes, filled from a
+# history_store.HistoryStore when one is given. attach() to a
+# ws_events.EventClient so completions (and failures) are picked up
+class ResultCache:
+    def __init__(self, server_address, store=None, capacity=1024):
+        self.server_address = server_address
+        self.store = store
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self._done = OrderedDict()  # graph hash -> prompt_id, least recently used first
+        self._in_flight = {}  # graph hash -> prompt_id
+        self._pending = {}  # graph hash -> Event while its submission is in progress
+        self._hash_of = {}  # prompt_id -> graph hash, for in flight prompts
+        self._lock = threading.Lock()
+        if store is not None:
+            # oldest first, so the newest end up most recently used
+            for prompt_id, entry in reversed(store.recent(capacity)):
+                self._remember(graph_hash(entry["prompt"][2]), prompt_id)
+
+    def _remember(self, key, prompt_id):
+        self._done[key] = prompt_id
+        self._done.move_to_end(key)
+        while len(self._done) > self.capacity:
+            self._done.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses + self.merged
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "evictions": self.evictions,
+            "size": len(self._done),
+            "in_flight": len(self._in_flight),
+            "hit_rate": (self.hits + self.merged) / lookups if lookups else 0.0,
+        }
+
+    # ===================================================================
+    # outputs of a finished prompt, None if the server no longer has them
+    def _outputs(self, prompt_id):
+        if self.store is not None:
+            entry = self.store.entry(prompt_id)
+        else:
+            entry = get_client(self.server_address).get_json(f'/history/{prompt_id}').get(prompt_id)
+        return None if entry is None else entry.get("outputs", {})
+
+    # queue a workflow unless its result exists or is being computed.
+    # returns {"prompt_id", "status": "hit" | "merged" | "queued", "outputs"}
+    # where outputs is only set for hits
+    def submit(self, prompt_workflow, client_id):
+        if isinstance(prompt_workflow, Workflow):
+            prompt_workflow = prompt_workflow.nodes
+        key = graph_hash(prompt_workflow)
+
+        while True:
+            with self._lock:
+                prompt_id = self._done.get(key)
+                if prompt_id is not None:
+                    self._done.move_to_end(key)
+                elif key in self._in_flight:
+                    self.merged += 1
+                    return {"prompt_id": self._in_flight[key], "status": "merged", "outputs": None}
+                elif key in self._pending:
+                    done = self._pending[key]
+                else:
+                    done = self._pending[key] = threading.Event()
+                    break
+            if prompt_id is None:
+                # the same graph is being submitted by another thread
+                done.wait()
+                continue
+            outputs = self._outputs(prompt_id)
+            if outputs is not None:
+                with self._lock:
+                    self.hits += 1
+                return {"prompt_id": prompt_id, "status": "hit", "outputs": outputs}
+            # deleted from the server's history, run it again
+            with self._lock:
+                if self._done.get(key) == prompt_id:
+                    del self._done[key]
+
+        try:
+            prompt_id = queue_prompt(prompt_workflow, self.server_address, client_id)['prompt_id']
+            with self._lock:
+                self.misses += 1
+                self._in_flight[key] = prompt_id
+                self._hash_of[prompt_id] = key
+            return {"prompt_id": prompt_id, "status": "queued", "outputs": None}
+        finally:
+            with self._lock:
+                del self._pending[key]
+            done.set()
+
+    # ===================================================================
+    # a prompt finished: its hash now points at a result
+    def completed(self, prompt_id, success=True):
+        with self._lock:
+            key = self._hash_of.pop(prompt_id, None)
+            if key is None:
+                return
+            self._in_flight.pop(key, None)
+            if success:
+                self._remember(key, prompt_id)
+
+    def handle(self, message_type, data):
+        prompt_id = data.get("prompt_id")
+        if message_type == "executing" and data.get("node") is None:
+            self.completed(prompt_id)
+        elif message_type in ("execution_error", "execution_interrupted"):
+            self.completed(prompt_id, success=False)
+
+    def attach(self, ws_client):
+        async def on_event(event):
+            # make sure the store has the entry before it can be served as a hit
+            if self.store is not None and event.type == "executing" and event.done and event.prompt_id:
+                await asyncio.get_running_loop().run_in_executor(None, self.store.sync_prompt, event.prompt_id)
+            self.handle(event.type, event.data)
+        ws_client.on("*", on_event)
+        return self
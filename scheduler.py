@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_client, HttpError
+from batch_submit import encode_variant, submit_windowed
+from terminalcolors import tcolor, color_text
+from ws_events import ExecutingEvent, StatusEvent
+from ws_session import Session
+
+# =======================================================================
+# one ComfyUI server in the pool.
+# tags describe what the box can run (e.g. {"sdxl", "flux"}), weight scales
+# its share of the work under the "weighted" policy
+class Backend:
+    def __init__(self, server_address, weight=1.0, tags=()):
+        self.server_address = server_address
+        self.weight = weight
+        self.tags = set(tags)
+        self.queue_depth = 0
+        self.vram_free = 0
+        self.healthy = True
+        self.last_polled = None
+
+    def __repr__(self):
+        return f"Backend({self.server_address!r}, queue_depth={self.queue_depth}, vram_free={self.vram_free}, healthy={self.healthy})"
+
+# =======================================================================
+# routes prompts across several ComfyUI servers.
+# every backend's /queue and /system_stats are polled (poll() or start() for
+# a background thread), and each new prompt goes to the least loaded
+# compatible backend:
+#   "least_queue" - fewest running + pending jobs, most free VRAM breaks ties
+#   "weighted"    - lowest queue depth relative to the backend's weight
+class Scheduler:
+    POLICIES = ("least_queue", "weighted")
+
+    def __init__(self, backends, policy="least_queue", poll_interval=2.0, remember=10000):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown policy '{policy}', expected one of {self.POLICIES}")
+        self.backends = [b if isinstance(b, Backend) else Backend(b) for b in backends]
+        self.policy = policy
+        self.poll_interval = poll_interval
+        # prompt_id -> server_address, the last `remember` prompts (finished
+        # ones are dropped as soon as events() sees them finish)
+        self._assigned = OrderedDict()
+        self.remember = remember
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ===================================================================
+    def poll(self):
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as executor:
+            list(executor.map(self._poll_backend, self.backends))
+
+    def _poll_backend(self, backend):
+        http = get_client(backend.server_address)
+        try:
+            queue = http.get_json('/queue')
+            stats = http.get_json('/system_stats')
+        except (OSError, HttpError):
+            backend.healthy = False
+            return
+        with self._lock:
+            backend.queue_depth = len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+            backend.vram_free = max((d.get("vram_free", 0) for d in stats.get("devices", [])), default=0)
+            backend.healthy = True
+            backend.last_polled = time.time()
+
+    # poll in a background thread until stop()
+    def start(self):
+        self.poll()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+
+    # ===================================================================
+    # choose a backend for one prompt and count the prompt against it right
+    # away, so a burst of picks between two polls still spreads out
+    def pick(self, requires=(), min_vram=0):
+        requires = set(requires)
+        with self._lock:
+            candidates = [
+                b for b in self.backends
+                if b.healthy and requires <= b.tags and b.vram_free >= min_vram
+            ]
+            if not candidates:
+                raise RuntimeError(f"no healthy backend matches requires={sorted(requires)} min_vram={min_vram}")
+            if self.policy == "weighted":
+                backend = min(candidates, key=lambda b: (b.queue_depth + 1) / b.weight)
+            else:
+                backend = min(candidates, key=lambda b: (b.queue_depth, -b.vram_free))
+            backend.queue_depth += 1
+            return backend
+
+    # the server a prompt was sent to
+    def backend_of(self, prompt_id):
+        with self._lock:
+            return self._assigned.get(prompt_id)
+
+    def _assign(self, prompt_id, server_address):
+        with self._lock:
+            self._assigned[prompt_id] = server_address
+            while len(self._assigned) > self.remember:
+                self._assigned.popitem(last=False)
+
+    # ===================================================================
+    # submit one workflow (dict or encoded /prompt body), returns (server_address, prompt_id)
+    def submit(self, variant, client_id, requires=(), min_vram=0):
+        backend = self.pick(requires, min_vram)
+        try:
+            response = get_client(backend.server_address).post_json('/prompt', encode_variant(variant, client_id))
+            prompt_id = response.raise_for_status().json()['prompt_id']
+        except Exception:
+            with self._lock:
+                backend.queue_depth -= 1
+            raise
+        self._assign(prompt_id, backend.server_address)
+        return backend.server_address, prompt_id
+
+    # like batch_submit.submit_batch (same lazy window over the variants),
+    # but every item is routed on its own
+    def submit_batch(self, variants, client_id, concurrency=8, requires=(), min_vram=0, metrics=None):
+        def submit_one(variant):
+            start = time.perf_counter()
+            _, prompt_id = self.submit(variant, client_id, requires, min_vram)
+            return prompt_id, time.perf_counter() - start
+
+        return submit_windowed(variants, submit_one, concurrency, metrics)
+
+    # ===================================================================
+    # one websocket per backend, merged into a single async stream of
+    # (server_address, event). status events also refresh the queue depth
+    # between polls. every backend has a reconnecting ws_session.Session, a
+    # backend whose connection is down is marked unhealthy (and reported)
+    # until it is back, instead of silently going quiet
+    async def events(self, client_id):
+        merged = asyncio.Queue()
+        clients = []
+
+        for backend in self.backends:
+            ws_client = Session(backend.server_address, client_id)
+
+            async def forward(event, backend=backend):
+                if isinstance(event, StatusEvent) and event.queue_remaining is not None:
+                    with self._lock:
+                        backend.queue_depth = event.queue_remaining
+                if isinstance(event, ExecutingEvent) and event.done:
+                    with self._lock:
+                        self._assigned.pop(event.prompt_id, None)
+                await merged.put((backend.server_address, event))
+
+            async def connection_changed(connected, error, backend=backend):
+                with self._lock:
+                    backend.healthy = connected
+                if not connected:
+                    print(color_text(f"No websocket to {backend.server_address} ({error!r}), reconnecting", tcolor.RED))
+
+            ws_client.on("*", forward)
+            ws_client.on_connection(connection_changed)
+            clients.append(ws_client)
+
+        tasks = [asyncio.create_task(ws_client.run()) for ws_client in clients]
+        try:
+            while True:
+                yield await merged.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for ws_client in clients:
+                await ws_client.close()
+
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib import parse
+from http_client import get_client
+from workflow import Workflow
+
+CACHE_DIR = '.object_info_cache'
+
+# =======================================================================
+# raised by SchemaRegistry.check(), errors is a list of messages
+class WorkflowValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__("invalid workflow:\n  " + "\n  ".join(errors))
+        self.errors = errors
+
+# =======================================================================
+# which node classes were added, removed or changed between two
+# /object_info documents
+def diff(old, new):
+    return {
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "changed": sorted(name for name in set(old) & set(new) if old[name] != new[name]),
+    }
+
+# =======================================================================
+# /object_info fetched once and kept on disk per server, so the several MB
+# document isn't downloaded (and parsed) on every start.
+# the cache is reused for max_age seconds. after that it is revalidated with
+# If-None-Match when the server sent an ETag, and otherwise by comparing
+# the sha256 of the body, so an unchanged document is not parsed or
+# rewritten again. single classes are refreshed with /object_info/{class}.
+# check()/validate() test a workflow against the schemas before it is
+# queued: unknown classes, missing inputs, link types, literal types,
+# enum values (sampler_name, ...) and numeric min/max
+class SchemaRegistry:
+    def __init__(self, server_address, cache_dir=CACHE_DIR, max_age=3600):
+        self.server_address = server_address
+        self.max_age = max_age
+        self.path = os.path.join(cache_dir, server_address.replace(':', '_') + '.json')
+        self._cache = None  # {"etag", "sha256", "fetched_at", "classes"}
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._cache is None and os.path.isfile(self.path):
+            with open(self.path, 'r') as file:
+                self._cache = json.load(file)
+        return self._cache
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.part', 'w') as file:
+            json.dump(self._cache, file)
+        os.replace(self.path + '.part', self.path)
+
+    @property
+    def classes(self):
+        with self._lock:
+            cache = self._load()
+            if cache is None or time.time() - cache["fetched_at"] > self.max_age:
+                self.refresh()
+            return self._cache["classes"]
+
+    # ===================================================================
+    # revalidate the whole document, returns diff() against the old one
+    def refresh(self):
+        with self._lock:
+            cache = self._load()
+            headers = {}
+            if cache is not None and cache.get("etag"):
+                headers['If-None-Match'] = cache["etag"]
+            response = get_client(self.server_address).request('GET', '/object_info', headers=headers)
+            old = cache["classes"] if cache is not None else {}
+
+            digest = None
+            if response.status != 304:
+                response.raise_for_status()
+                digest = hashlib.sha256(response.body).hexdigest()
+            if digest is None or (cache is not None and digest == cache.get("sha256")):
+                cache["fetched_at"] = time.time()
+                self._save()
+                return diff(old, old)
+
+            self._cache = {
+                "etag": response.headers.get('ETag'),
+                "sha256": digest,
+                "fetched_at": time.time(),
+                "classes": response.json(),
+            }
+            self._save()
+            return diff(old, self._cache["classes"])
+
+    # refetch one class (e.g. a custom node installed since the last
+    # refresh, or new files in a model/image list), returns its schema or None
+    def refresh_class(self, node_class):
+        with self._lock:
+            info = get_client(self.server_address).get_json(f'/object_info/{parse.quote(node_class)}')
+            classes = self.classes
+            if node_class in info:
+                classes[node_class] = info[node_class]
+            else:
+                classes.pop(node_class, None)
+            # the document no longer matches the server's, revalidate in full next time
+            self._cache["sha256"] = None
+            self._cache["etag"] = None
+            self._save()
+            return classes.get(node_class)
+
+    def schema(self, node_class):
+        return self.classes.get(node_class)
+
+    # ===================================================================
+    # list of problems with a workflow, empty if it looks valid.
+    # a class or enum value the cache doesn't know is refetched once
+    # before it counts as an error, the cache may just be stale
+    def validate(self, prompt_workflow):
+        if isinstance(prompt_workflow, Workflow):
+            prompt_workflow = prompt_workflow.nodes
+        errors = []
+        refreshed = set()
+
+        def schema_of(node_class, stale=False):
+            if (stale or node_class not in self.classes) and node_class not in refreshed:
+                refreshed.add(node_class)
+                return self.refresh_class(node_class)
+            return self.classes.get(node_class)
+
+        for node_id, node in prompt_workflow.items():
+            node_class = node.get("class_type")
+            schema = schema_of(node_class)
+            if schema is None:
+                errors.append(f"node {node_id}: unknown class '{node_class}'")
+                continue
+            problems = self._check_node(prompt_workflow, node, schema)
+            if any(enum for _, enum in problems):
+                schema = schema_of(node_class, stale=True)
+                problems = self._check_node(prompt_workflow, node, schema) if schema else problems
+            errors.extend(f"node {node_id} ({node_class}): {message}" for message, _ in problems)
+        return errors
+
+    def check(self, prompt_workflow):
+        errors = self.validate(prompt_workflow)
+        if errors:
+            raise WorkflowValidationError(errors)
+        return prompt_workflow
+
+    # [(message, is_enum_error)] for one node
+    def _check_node(self, prompt_workflow, node, schema):
+        problems = []
+        inputs = node.get("inputs", {})
+        spec_inputs = schema.get("input", {})
+        for section in ("required", "optional"):
+            for name, spec in spec_inputs.get(section, {}).items():
+                if name not in inputs:
+                    if section == "required":
+                        problems.append((f"missing required input '{name}'", False))
+                    continue
+                value = inputs[name]
+                if _is_link(value):
+                    message = self._check_link(prompt_workflow, name, value, spec[0])
+                else:
+                    message = _check_value(name, value, spec[0], spec[1] if len(spec) > 1 else {})
+                if message:
+                    problems.append((message, isinstance(spec[0], list)))
+        return problems
+
+    def _check_link(self, prompt_workflow, name, link, expected):
+        source = prompt_workflow.get(str(link[0]))
+        if source is None:
+            return f"input '{name}' links to missing node {link[0]}"
+        source_schema = self.classes.get(source.get("class_type"))
+        if source_schema is None:
+            return None  # reported on the source node itself
+        outputs = source_schema.get("output", [])
+        if not 0 <= link[1] < len(outputs):
+            return f"input '{name}' links to output {link[1]} of node {link[0]}, which has {len(outputs)} outputs"
+        produced = outputs[link[1]]
+        if isinstance(expected, str) and isinstance(produced, str) and "*" not in (expected, produced):
+            if not set(produced.split(",")) & set(expected.split(",")):
+                return f"input '{name}' expects {expected}, node {link[0]} output {link[1]} is {produced}"
+        return None
+
+# =======================================================================
+def _is_link(value):
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[1], int)
+
+def _check_value(name, value, expected, options):
+    if isinstance(expected, list):
+        # uploads land in the input folder after the list was fetched
+        if value not in expected and not options.get("image_upload"):
+            return f"input '{name}' value {value!r} not in {expected[:10]}{' ...' if len(expected) > 10 else ''}"
+        return None
+    if expected == "INT":
+        if not isinstance(value, int) or isinstance(value, bool):
+            return f"input '{name}' expects INT, got {type(value).__name__}"
+    elif expected == "FLOAT":
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return f"input '{name}' expects FLOAT, got {type(value).__name__}"
+    elif expected == "STRING":
+        return None if isinstance(value, str) else f"input '{name}' expects STRING, got {type(value).__name__}"
+    elif expected == "BOOLEAN":
+        return None if isinstance(value, bool) else f"input '{name}' expects BOOLEAN, got {type(value).__name__}"
+    else:
+        # MODEL, LATENT, ... only come from links
+        return f"input '{name}' expects a {expected} link, got {value!r}"
+
+    if "min" in options and value < options["min"]:
+        return f"input '{name}' value {value} below minimum {options['min']}"
+    if "max" in options and value > options["max"]:
+        return f"input '{name}' value {value} above maximum {options['max']}"
+    return None
+
+# =======================================================================
+# one shared registry per server_address
+_registries = {}
+_registries_lock = threading.Lock()
+
+def get_registry(server_address, **options):
+    with _registries_lock:
+        registry = _registries.get(server_address)
+        if registry is None:
+            registry = SchemaRegistry(server_address, **options)
+            _registries[server_address] = registry
+        return registry
@@ -0,0 +1,203 @@
+import itertools
+import random
+import time
+from collections.abc import Sequence
+from batch_submit import BatchResult, submit_batch
+from http_client import get_client
+from node_resolver import get_resolver, node_classes
+from workflow import Workflow
+from workflow_template import WorkflowTemplate
+
+LATENCY_SAMPLES = 10000
+
+# =======================================================================
+# one swept input: a node (title or id), one of its inputs and the values
+# to try. values can be any sequence, a range() stays lazy
+class Axis:
+    def __init__(self, name, node_ref, input_name, values, value_type=None):
+        if not isinstance(values, Sequence) or isinstance(values, (str, bytes)):
+            values = tuple(values)
+        if not values:
+            raise ValueError(f"axis '{name}' has no values")
+        self.name = name
+        self.node_ref = node_ref
+        self.input_name = input_name
+        self.values = values
+        self.value_type = value_type
+
+    def slot(self):
+        if self.value_type is None:
+            return (self.node_ref, self.input_name)
+        return (self.node_ref, self.input_name, self.value_type)
+
+# =======================================================================
+# a parameter sweep over a workflow.
+# axes maps name -> (node title or id, input name, values[, type]), e.g.
+#   Sweep(workflow, {
+#       "cfg": ("KSampler", "cfg", [5, 7, 9], float),
+#       "sampler": ("KSampler", "sampler_name", ["euler", "dpmpp_2m"]),
+#       "seed": ("KSampler", "seed", range(1000)),
+#   })
+# mode:
+#   "product" - every combination (cartesian product)
+#   "zip"     - the axes in lockstep, stops at the shortest one
+#   "random"  - `samples` distinct combinations picked at random
+# fixed sets inputs that are the same for every variant, same spec without values.
+# variants are generated lazily, nothing is materialized up front
+class Sweep:
+    MODES = ("product", "zip", "random")
+
+    def __init__(self, prompt_workflow, axes, mode="product", samples=None, seed=None, fixed=None):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown sweep mode '{mode}', expected one of {', '.join(self.MODES)}")
+        if mode == "random" and samples is None:
+            raise ValueError("random sweeps need a number of samples")
+        if isinstance(prompt_workflow, Workflow):
+            prompt_workflow = prompt_workflow.nodes
+
+        self.axes = []
+        for name, spec in axes.items():
+            node_ref, input_name, values = spec[:3]
+            self.axes.append(Axis(name, node_ref, input_name, values, spec[3] if len(spec) > 3 else None))
+        self.fixed = {}
+        slots = {axis.name: axis.slot() for axis in self.axes}
+        for name, (*slot, value) in (fixed or {}).items():
+            slots[name] = tuple(slot)
+            self.fixed[name] = value
+
+        self.mode = mode
+        self.samples = samples
+        self.seed = seed
+        self.template = WorkflowTemplate(prompt_workflow, slots)
+        self.classes = node_classes(prompt_workflow)
+
+    # number of variants the sweep produces
+    def __len__(self):
+        sizes = [len(axis.values) for axis in self.axes]
+        if self.mode == "zip":
+            return min(sizes)
+        total = 1
+        for size in sizes:
+            total *= size
+        return min(total, self.samples) if self.mode == "random" else total
+
+    # ===================================================================
+    # the slot values of every variant, as dicts
+    def variants(self):
+        names = [axis.name for axis in self.axes]
+        columns = [axis.values for axis in self.axes]
+        if self.mode == "product":
+            combinations = itertools.product(*columns)
+        elif self.mode == "zip":
+            combinations = zip(*columns)
+        else:
+            combinations = self._sampled(columns)
+        for combination in combinations:
+            yield dict(zip(names, combination))
+
+    # random combinations without replacement: walk a random permutation of
+    # the product space's indices and decode them, so neither the product
+    # nor the list of picked indices is ever built
+    def _sampled(self, columns):
+        sizes = [len(values) for values in columns]
+        total = 1
+        for size in sizes:
+            total *= size
+        rng = random.Random(self.seed)
+        for index in itertools.islice(_permutation(total, rng), self.samples):
+            combination = []
+            for values, size in zip(reversed(columns), reversed(sizes)):
+                index, position = divmod(index, size)
+                combination.append(values[position])
+            yield tuple(reversed(combination))
+
+    # (values, encoded /prompt body) for every variant
+    def payloads(self, client_id):
+        for values in self.variants():
+            yield values, self.template.render(client_id, **self.fixed, **values)
+
+# =======================================================================
+# a random permutation of range(total), generated one index at a time in
+# constant memory: a keyed 6 round Feistel network is a bijection on the
+# smallest even bit width covering total, indices it maps past the end are
+# mapped again (cycle walking) until they land in range
+def _permutation(total, rng):
+    half = max(1, ((total - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = [rng.getrandbits(64) for _ in range(6)]
+
+    # round function: the splitmix64 finalizer of right + key
+    def mix(value):
+        value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+        value = (value ^ (value >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+        return value ^ (value >> 31)
+
+    def encrypt(x):
+        left, right = x >> half, x & mask
+        for key in keys:
+            left, right = right, left ^ (mix(right + key) & mask)
+        return (left << half) | right
+
+    for index in range(total):
+        index = encrypt(index)
+        while index >= total:
+            index = encrypt(index)
+        yield index
+
+# =======================================================================
+# prompts running or pending on the server (the cheap GET /prompt endpoint)
+def queue_remaining(server_address):
+    return get_client(server_address).get_json('/prompt')["exec_info"]["queue_remaining"]
+
+# =======================================================================
+# submit a sweep without flooding the server: only top the server queue up
+# to max_queue, wait while it is full, then pull the next variants from the
+# generator. on_submit(values, prompt_id) is called for every variant that
+# was queued, errors of the returned BatchResult are keyed by variant index.
+# prompt_ids are only kept when keep_ids is set (otherwise the result's
+# prompt_ids is None and total counts the variants), for sweeps too big for
+# that use on_submit to write them out instead. the result's latencies are
+# a random sample of at most LATENCY_SAMPLES submissions. metrics: see batch_submit.submit_batch
+def submit_sweep(sweep, server_address, client_id, max_queue=8, concurrency=4,
+                 poll_interval=1.0, on_submit=None, keep_ids=True, metrics=None):
+    resolver = get_resolver(server_address)
+    variants = sweep.payloads(client_id)
+    prompt_ids, errors, latencies = [], {}, []
+    offset = submitted = 0
+    rng = random.Random()
+
+    start = time.perf_counter()
+    while True:
+        room = max_queue - queue_remaining(server_address)
+        if room <= 0:
+            time.sleep(poll_interval)
+            continue
+        chunk = list(itertools.islice(variants, room))
+        if not chunk:
+            break
+
+        result = submit_batch((body for _, body in chunk), server_address, client_id,
+                              concurrency=concurrency, metrics=metrics)
+        for (values, _), prompt_id in zip(chunk, result.prompt_ids):
+            if prompt_id is None:
+                continue
+            resolver.register(prompt_id, sweep.classes)
+            if on_submit is not None:
+                on_submit(values, prompt_id)
+        for index, e in result.errors.items():
+            errors[offset + index] = e
+        if keep_ids:
+            prompt_ids.extend(result.prompt_ids)
+        # reservoir sample, every submission is equally likely to be kept
+        for latency in result.latencies:
+            submitted += 1
+            if len(latencies) < LATENCY_SAMPLES:
+                latencies.append(latency)
+            else:
+                slot = rng.randrange(submitted)
+                if slot < LATENCY_SAMPLES:
+                    latencies[slot] = latency
+        offset += len(chunk)
+
+    return BatchResult(prompt_ids if keep_ids else None, errors, latencies,
+                       time.perf_counter() - start, total=offset)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_client
+
+CHUNK_SIZE = 256 * 1024
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+# =======================================================================
+# streaming multipart/form-data body.
+# fields are (name, value) text parts, files are (name, filename, source)
+# where source is a path on disk, bytes or a memoryview. files are read in
+# chunks as the body is sent, nothing is decoded or re-encoded. the length
+# is known up front so the request goes out with a normal Content-Length
+class MultipartEncoder:
+    def __init__(self, fields=(), files=(), chunk_size=CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._parts = []  # (header bytes, source or None, length)
+
+        for name, value in fields:
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'
+            ).encode('utf-8')
+            self._parts.append((header, None, 0))
+
+        for name, filename, source in files:
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n'
+            ).encode('utf-8')
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                source = memoryview(source)
+                length = source.nbytes
+            else:
+                length = os.path.getsize(source)
+            self._parts.append((header, source, length))
+
+        self._closing = f'--{self.boundary}--\r\n'.encode('ascii')
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    @property
+    def content_length(self):
+        total = len(self._closing)
+        for header, source, length in self._parts:
+            total += len(header) + length + (2 if source is not None else 0)
+        return total
+
+    def headers(self):
+        return {'Content-Type': self.content_type, 'Content-Length': str(self.content_length)}
+
+    # ===================================================================
+    def __iter__(self):
+        for header, source, length in self._parts:
+            yield header
+            if source is None:
+                continue
+            if isinstance(source, memoryview):
+                for start in range(0, length, self.chunk_size):
+                    yield source[start:start + self.chunk_size]
+            else:
+                with open(source, 'rb') as file:
+                    while chunk := file.read(self.chunk_size):
+                        yield chunk
+            yield b'\r\n'
+        yield self._closing
+
+# =======================================================================
+# upload one image (path, bytes or memoryview) to /upload/image, or to
+# /upload/mask for masks. returns the server's JSON response
+def upload_file(server_address, source, filename=None, subfolder=None, image_type=None,
+                original_ref=None, overwrite=False, mask=False):
+    if filename is None:
+        filename = os.path.basename(source)
+    fields = []
+    if subfolder:
+        fields.append(('subfolder', subfolder))
+    if image_type:
+        fields.append(('type', image_type))
+    if overwrite:
+        fields.append(('overwrite', 'true'))
+    if original_ref:
+        fields.append(('original_ref', json.dumps(original_ref)))
+    encoder = MultipartEncoder(fields, [('image', filename, source)])
+
+    path = '/upload/mask' if mask or original_ref else '/upload/image'
+    response = get_client(server_address).request('POST', path, body=encoder, headers=encoder.headers())
+    return response.raise_for_status().json()
+
+# =======================================================================
+def file_hash(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# =======================================================================
+# upload every image in a directory with a pool of workers.
+# files are deduplicated by sha256: identical files in the batch are only
+# sent once, and files already uploaded to this server (recorded in the
+# manifest JSON, default <directory>/.upload_manifest.json) are skipped.
+# returns {path: response dict or exception}; skipped files get the earlier
+# response, duplicates of a file whose upload failed get its exception
+def upload_directory(server_address, directory, subfolder=None, workers=4, manifest_path=None,
+                     extensions=IMAGE_EXTENSIONS):
+    if manifest_path is None:
+        manifest_path = os.path.join(directory, '.upload_manifest.json')
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    uploaded = manifest.setdefault(server_address, {})  # 'subfolder:sha256' -> response
+    lock = threading.Lock()
+    pending = {}  # 'subfolder:sha256' -> Event for uploads in flight, so duplicates wait instead of re-sending
+    failed = {}  # 'subfolder:sha256' -> exception of the failed upload
+
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(extensions) and os.path.isfile(os.path.join(directory, name))
+    )
+
+    def upload_one(path):
+        digest = file_hash(path)
+        key = f'{subfolder or ""}:{digest}'
+        with lock:
+            if key in uploaded:
+                return uploaded[key]
+            if key in pending:
+                done = pending[key]
+                owner = False
+            else:
+                done = pending[key] = threading.Event()
+                owner = True
+        if not owner:
+            done.wait()
+            with lock:
+                if key in failed:
+                    raise failed[key]
+                return uploaded[key]
+        try:
+            result = upload_file(server_address, path, subfolder=subfolder)
+            with lock:
+                uploaded[key] = result
+            return result
+        except Exception as e:
+            with lock:
+                failed[key] = e
+            raise
+        finally:
+            done.set()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(path, executor.submit(upload_one, path)) for path in paths]
+        for path, future in futures:
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return results
@@ -0,0 +1,122 @@
+import hashlib
+import json
+from terminalcolors import tcolor, color_text
+
+# =======================================================================
+# a workflow (API format) with title, class_type and node-id indexes.
+# the indexes are built once, so node lookups are O(1) no matter how big the
+# graph is. node dicts are shared with the source dict, not copied
+class Workflow:
+    def __init__(self, prompt_workflow):
+        self.nodes = prompt_workflow
+        self._by_title = {}  # lowercase title -> [node ids]
+        self._by_class = {}  # class_type -> [node ids]
+
+        for node_id, node in prompt_workflow.items():
+            title = node.get("_meta", {}).get("title")
+            if title is not None:
+                self._by_title.setdefault(title.lower(), []).append(node_id)
+            self._by_class.setdefault(node.get("class_type", ""), []).append(node_id)
+
+    @classmethod
+    def load(cls, path='workflow_api.json'):
+        with open(path, 'r') as file:
+            return cls(json.load(file))
+
+    # ===================================================================
+    # node id for a title (case-insensitive) or a node id, raises KeyError
+    def find_id(self, node_ref):
+        # ids are str keys in API format, 3 and "3" are the same node
+        if str(node_ref) in self.nodes:
+            return str(node_ref)
+        node_ids = self._by_title.get(str(node_ref).lower())
+        if not node_ids:
+            raise KeyError(f"No node found with title or id '{node_ref}'")
+        return node_ids[0]
+
+    # get a node via its title (case-insensitive), None if there isn't one.
+    # with duplicate titles the first node in the workflow is returned
+    def node(self, title):
+        node_ids = self._by_title.get(title.lower())
+        if not node_ids:
+            print(color_text(f"Warning: No node found with title '{title}'.", tcolor.RED))
+            return None
+        if len(node_ids) > 1:
+            print(color_text(f"Warning: {len(node_ids)} nodes have the title '{title}', using node {node_ids[0]}.", tcolor.YELLOW))
+        return self.nodes[node_ids[0]]
+
+    def node_by_id(self, node_id):
+        return self.nodes.get(str(node_id))
+
+    def nodes_by_class(self, class_type):
+        return [self.nodes[node_id] for node_id in self._by_class.get(class_type, [])]
+
+    # class_type of a node id, "" if the node isn't in the workflow
+    def class_of(self, node_id):
+        node = self.nodes.get(str(node_id))
+        return node.get("class_type", "") if node else ""
+
+    # titles used by more than one node: {title: [node ids]}
+    def duplicate_titles(self):
+        return {
+            self.nodes[node_ids[0]]["_meta"]["title"]: node_ids
+            for node_ids in self._by_title.values() if len(node_ids) > 1
+        }
+
+    # ===================================================================
+    # set an input on every node of a class, returns the number of nodes changed
+    def set_class_input(self, class_type, input_name, value):
+        nodes = self.nodes_by_class(class_type)
+        for node in nodes:
+            node["inputs"][input_name] = value
+        return len(nodes)
+
+# =======================================================================
+# content signature of every node: its class, its literal inputs and the
+# signatures of the nodes its links point at (Merkle style). titles/_meta
+# and node ids don't take part, so a renumbered copy of a graph gets the
+# same signatures. returns {node_id: hex digest}.
+# nodes are signed in topological order with an explicit stack, so a deep
+# chain of nodes doesn't hit the recursion limit. raises ValueError on a cycle
+def node_signatures(prompt_workflow):
+    if isinstance(prompt_workflow, Workflow):
+        prompt_workflow = prompt_workflow.nodes
+    signatures = {}
+
+    def is_link(value):
+        return (isinstance(value, list) and len(value) == 2
+                and isinstance(value[1], int) and str(value[0]) in prompt_workflow)
+
+    for root in prompt_workflow:
+        stack = [root]
+        visiting = set()  # on the stack, waiting for their inputs
+        while stack:
+            node_id = stack[-1]
+            if node_id in signatures:
+                stack.pop()
+                continue
+            inputs = prompt_workflow[node_id].get("inputs", {})
+            missing = [str(value[0]) for value in inputs.values()
+                       if is_link(value) and str(value[0]) not in signatures]
+            if missing:
+                if node_id in visiting or any(link in visiting for link in missing):
+                    raise ValueError(f"workflow has a cycle through node {node_id}")
+                visiting.add(node_id)
+                stack.extend(missing)
+                continue
+            # a link is identified by what produces it, not by the node id
+            signed = {name: ["@link", signatures[str(value[0])], value[1]] if is_link(value) else value
+                      for name, value in inputs.items()}
+            canonical = json.dumps([prompt_workflow[node_id].get("class_type"), signed],
+                                   sort_keys=True, separators=(',', ':'))
+            signatures[node_id] = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+            visiting.discard(node_id)
+            stack.pop()
+    return signatures
+
+# hash of the whole resolved graph, independent of node ids and titles
+def graph_hash(prompt_workflow):
+    digest = hashlib.sha256()
+    for signature in sorted(node_signatures(prompt_workflow).values()):
+        digest.update(signature.encode('ascii'))
+    return digest.hexdigest()
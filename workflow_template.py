@@ -0,0 +1,99 @@
+import copy
+import json
+import uuid
+from workflow import Workflow
+
+# =======================================================================
+# typed placeholder for one variable input of a workflow
+class Slot:
+    def __init__(self, name, node_id, input_name, value_type, default):
+        self.name = name
+        self.node_id = node_id
+        self.input_name = input_name
+        self.value_type = value_type
+        self.default = default
+
+    # encode a value straight to its JSON bytes
+    def encode(self, value):
+        if self.value_type is int:
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise TypeError(f"slot '{self.name}' expects int, got {type(value).__name__}")
+            return str(value).encode('ascii')
+        if self.value_type is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        elif not isinstance(value, self.value_type):
+            raise TypeError(f"slot '{self.name}' expects {self.value_type.__name__}, got {type(value).__name__}")
+        return json.dumps(value).encode('utf-8')
+
+# =======================================================================
+# a workflow compiled into a /prompt request body with holes in it.
+# the static parts are serialized once, each variant then only encodes its
+# slot values and splices them between the pre-encoded chunks.
+# slots maps slot name -> (node title or node id, input name[, type]), e.g.
+#   {"seed": ("KSampler", "seed"), "cfg": ("KSampler", "cfg", float)}
+# without a type, the slot takes the type of the value in the workflow.
+# prompt_workflow can be a workflow dict or a Workflow
+class WorkflowTemplate:
+    def __init__(self, prompt_workflow, slots):
+        if isinstance(prompt_workflow, Workflow):
+            prompt_workflow = prompt_workflow.nodes
+        # work on a private copy, the caller's dict is never touched
+        workflow = copy.deepcopy(prompt_workflow)
+        index = Workflow(workflow)
+        marker = uuid.uuid4().hex
+
+        self.slots = {}
+        for name, spec in slots.items():
+            node_ref, input_name = spec[0], spec[1]
+            if not name.isidentifier():
+                raise ValueError(f"slot name '{name}' must be a valid identifier")
+            node_id = index.find_id(node_ref)
+            inputs = workflow[node_id]["inputs"]
+            if input_name not in inputs:
+                raise KeyError(f"node '{node_ref}' has no input '{input_name}'")
+            default = inputs[input_name]
+            if isinstance(default, list):
+                raise ValueError(f"input '{input_name}' of node '{node_ref}' is a link, not a value")
+            value_type = spec[2] if len(spec) > 2 else type(default)
+            self.slots[name] = Slot(name, node_id, input_name, value_type, default)
+            # replace the value with a unique string we can find after encoding
+            inputs[input_name] = f"{marker}:{name}"
+
+        # client_id is not a valid slot name, so it can't clash
+        encoded = json.dumps({"prompt": workflow, "client_id": f"{marker}:"}).encode('utf-8')
+
+        # split the encoded body into static chunks and the slot order between them
+        self._chunks = []
+        self._order = []
+        prefix = f'"{marker}:'.encode('ascii')
+        position = 0
+        while (index := encoded.find(prefix, position)) != -1:
+            end = encoded.index(b'"', index + len(prefix))
+            name = encoded[index + len(prefix):end].decode('utf-8')
+            self._chunks.append(encoded[position:index])
+            self._order.append(name or None)  # None is the client_id
+            position = end + 1
+        self._chunks.append(encoded[position:])
+
+    # ===================================================================
+    # build the request body for one variant. slots that are not given keep
+    # the value they had in the source workflow
+    def render(self, client_id, **values):
+        unknown = set(values) - set(self.slots)
+        if unknown:
+            raise KeyError(f"unknown slot(s): {', '.join(sorted(unknown))}")
+
+        encoded_client = json.dumps(client_id).encode('utf-8')
+        encoded_values = {}
+        for name, slot in self.slots.items():
+            encoded_values[name] = slot.encode(values.get(name, slot.default))
+
+        parts = [self._chunks[0]]
+        for name, chunk in zip(self._order, self._chunks[1:]):
+            parts.append(encoded_client if name is None else encoded_values[name])
+            parts.append(chunk)
+        return b''.join(parts)
+
+    # the resolved workflow dict for one variant (mostly useful for debugging)
+    def workflow(self, **values):
+        return json.loads(self.render("", **values))["prompt"]
@@ -0,0 +1,293 @@
+import asyncio
+import json_codec
+import ws_protocol
+from http_client import get_client, HttpError
+from terminalcolors import tcolor, color_text
+
+# =======================================================================
+# typed websocket events, see data/message_*.json for the raw shapes.
+# every event keeps the decoded `data` dict; the subclasses just pull out
+# the fields handlers care about
+class Event:
+    type = None
+
+    def __init__(self, data):
+        self.data = data
+        self.prompt_id = data.get("prompt_id")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.data!r})"
+
+
+class StatusEvent(Event):
+    type = "status"
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.queue_remaining = data.get("status", {}).get("exec_info", {}).get("queue_remaining")
+        self.sid = data.get("sid")
+
+
+class ExecutionStartEvent(Event):
+    type = "execution_start"
+
+
+class ExecutionCachedEvent(Event):
+    type = "execution_cached"
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.nodes = data.get("nodes", [])
+
+
+class ExecutingEvent(Event):
+    type = "executing"
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.node = data.get("node")
+
+    # `executing` with node None marks the end of a prompt
+    @property
+    def done(self):
+        return self.node is None
+
+
+class ProgressEvent(Event):
+    type = "progress"
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.value = data.get("value")
+        self.max = data.get("max")
+        self.node = data.get("node")
+
+
+class ExecutedEvent(Event):
+    type = "executed"
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.node = data.get("node")
+        self.output = data.get("output", {})
+
+
+EVENT_TYPES = {cls.type: cls for cls in (
+    StatusEvent, ExecutionStartEvent, ExecutionCachedEvent, ExecutingEvent, ProgressEvent, ExecutedEvent
+)}
+
+# =======================================================================
+# decode a text frame once into a typed event (unknown types get a plain Event)
+def decode_event(payload):
+    message = json_codec.loads(payload)
+    cls = EVENT_TYPES.get(message.get("type"))
+    if cls is None:
+        event = Event(message.get("data") or {})
+        event.type = message.get("type")
+        return event
+    return cls(message.get("data") or {})
+
+# the executed events and the final executing(None) of a finished prompt,
+# rebuilt from its /history entry (with data["recovered"] = True)
+def history_events(prompt_id, entry):
+    events = [ExecutedEvent({"node": node_id, "output": output, "prompt_id": prompt_id, "recovered": True})
+              for node_id, output in entry.get("outputs", {}).items()]
+    events.append(ExecutingEvent({"node": None, "prompt_id": prompt_id, "recovered": True}))
+    return events
+
+# =======================================================================
+# the events of one prompt, returned by EventClient.follow(). registered
+# with the client when created, ends after the prompt finished.
+# with poll, /history is checked before the first wait and whenever no event
+# came for poll seconds: a prompt that finished without its end being seen
+# (before follow(), or while the connection was down) is completed from its
+# history entry. executed events already seen are not repeated
+class Follower:
+    def __init__(self, client, prompt_id, poll=None):
+        self.client = client
+        self.prompt_id = prompt_id
+        self.poll = poll
+        self.finished = False
+        self._queue = asyncio.Queue()
+        self._started = False
+        self._executed = set()  # node ids
+        client._followers.setdefault(prompt_id, []).append(self._queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        try:
+            if not self._started:
+                self._started = True
+                await self.client._followed(self.prompt_id)
+                if self.poll is not None:
+                    await self._check_history()
+            while True:
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), self.poll)
+                except asyncio.TimeoutError:
+                    await self._check_history()
+                    continue
+                if isinstance(event, BaseException):
+                    raise event  # e.g. the connection was lost, see fail()
+                if isinstance(event, ExecutedEvent):
+                    if event.node in self._executed:
+                        continue
+                    self._executed.add(event.node)
+                if isinstance(event, ExecutingEvent) and event.done:
+                    self.close()
+                return event
+        except BaseException:
+            self.close()
+            raise
+
+    async def _check_history(self):
+        loop = asyncio.get_running_loop()
+        http = get_client(self.client.server_address)
+        try:
+            history = await loop.run_in_executor(None, http.get_json, f'/history/{self.prompt_id}')
+        except (OSError, HttpError, ValueError):
+            return  # try again on the next poll
+        entry = history.get(self.prompt_id)
+        if entry is not None:
+            for event in history_events(self.prompt_id, entry):
+                self._queue.put_nowait(event)
+
+    def close(self):
+        self.finished = True
+        followers = self.client._followers.get(self.prompt_id, [])
+        if self._queue in followers:
+            followers.remove(self._queue)
+        if not followers:
+            self.client._followers.pop(self.prompt_id, None)
+
+    async def aclose(self):
+        self.close()
+
+# =======================================================================
+# asyncio websocket client for /ws.
+# handlers are async callables registered per event type (or "*" for all)
+# and are awaited in order, so they see events in the order the server sent
+# them. binary frames (previews) go to the preview handlers instead of
+# ending the loop. prompts can be followed individually with follow(), so
+# one process can track many concurrent prompts on one connection
+class EventClient:
+    def __init__(self, server_address, client_id, timeout=10, max_size=ws_protocol.MAX_MESSAGE_SIZE):
+        self.server_address = server_address
+        self.client_id = client_id
+        self.timeout = timeout
+        self.max_size = max_size
+        self._handlers = {}
+        self._preview_handlers = []
+        self._followers = {}  # prompt_id -> [asyncio.Queue]
+        self.handler_errors = 0
+        self._reader = None
+        self._writer = None
+
+    # ===================================================================
+    # register a handler, usable as a decorator: @client.on("progress")
+    def on(self, event_type, handler=None):
+        if handler is None:
+            return lambda fn: self.on(event_type, fn)
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def on_preview(self, handler):
+        self._preview_handlers.append(handler)
+        return handler
+
+    # ===================================================================
+    # follow one prompt: an async iterator over its events that stops after
+    # the prompt finished (executing with node None), see Follower.
+    # it is registered right away, so events that arrive between follow()
+    # and the first iteration are not lost. events from before follow() are
+    # covered by the /history check (poll=None turns it off)
+    def follow(self, prompt_id, poll=10.0):
+        return Follower(self, prompt_id, poll)
+
+    # called once before a follower waits for its first event.
+    # subclasses can extend their subscription here (event_hub.HubClient)
+    async def _followed(self, prompt_id):
+        pass
+
+    # wait until a prompt has finished executing. /history is checked first
+    # and then every `poll` seconds without events, so a prompt that already
+    # finished doesn't hang; asyncio.TimeoutError after `timeout` seconds
+    async def wait_for(self, prompt_id, poll=10.0, timeout=None):
+        follower = self.follow(prompt_id, poll)
+
+        async def drain():
+            async for _ in follower:
+                pass
+        try:
+            await asyncio.wait_for(drain(), timeout)
+        finally:
+            follower.close()
+
+    # ===================================================================
+    async def connect(self):
+        host, _, port = self.server_address.partition(":")
+        path = f"/ws?clientId={self.client_id}"
+        self._reader, self._writer = await ws_protocol.connect(host, int(port or 80), path, self.timeout)
+
+    async def close(self):
+        if self._writer is not None:
+            try:
+                await ws_protocol.send_frame(self._writer, ws_protocol.OP_CLOSE, b'\x03\xe8')
+            except ConnectionError:
+                pass
+            self._writer.close()
+            self._writer = None
+
+    # receive and dispatch until the connection closes
+    async def run(self):
+        if self._writer is None:
+            await self.connect()
+        try:
+            while True:
+                opcode, payload = await ws_protocol.read_message(self._reader, self._writer, max_size=self.max_size)
+                if opcode == ws_protocol.OP_TEXT:
+                    await self.dispatch(decode_event(payload))
+                else:
+                    view = memoryview(payload)
+                    for handler in self._preview_handlers:
+                        await self._call(handler, view)
+        except (ws_protocol.WebSocketClosed, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    async def dispatch(self, event):
+        for handler in self._handlers.get(event.type, ()):
+            await self._call(handler, event)
+        for handler in self._handlers.get("*", ()):
+            await self._call(handler, event)
+        if event.prompt_id is not None:
+            for events in self._followers.get(event.prompt_id, ()):
+                events.put_nowait(event)
+            # every follower ends here, also those whose loop was left early
+            if isinstance(event, ExecutingEvent) and event.done:
+                self._followers.pop(event.prompt_id, None)
+
+    # a failing handler (e.g. an HTTP call in HistoryStore.attach) is logged
+    # and skipped, it must neither end run() nor pass for a dropped socket
+    async def _call(self, handler, argument):
+        try:
+            await handler(argument)
+        except Exception as e:
+            self.handler_errors += 1
+            name = getattr(handler, '__qualname__', repr(handler))
+            print(color_text(f"Event handler {name} failed: {e!r}", tcolor.RED))
+
+    # end every follower with error (raised from its iteration, and so from
+    # wait_for), for a client that gave up on its connection
+    def fail(self, error):
+        followers, self._followers = self._followers, {}
+        for queues in followers.values():
+            for events in queues:
+                events.put_nowait(error)
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+
+# minimal RFC 6455 websocket framing on top of asyncio streams (stdlib only)
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# largest message read_message accepts (all fragments together), bigger
+# ones close the connection with 1009 (message too big)
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+CLOSE_TOO_BIG = 1009
+
+class WebSocketClosed(Exception):
+    pass
+
+# =======================================================================
+def accept_key(key):
+    digest = hashlib.sha1((key + WS_GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+# =======================================================================
+# open a websocket, returns (reader, writer) once the handshake is done
+async def connect(host, port, path, timeout=10):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    handshake = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    )
+    writer.write(handshake.encode('ascii'))
+    await writer.drain()
+
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    lines = head.decode('latin1').split("\r\n")
+    if " 101 " not in lines[0] + " ":
+        writer.close()
+        raise ConnectionError(f"websocket handshake failed: {lines[0]}")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("sec-websocket-accept") != accept_key(key):
+        writer.close()
+        raise ConnectionError("websocket handshake failed: bad Sec-WebSocket-Accept")
+    return reader, writer
+
+# =======================================================================
+# encode one frame. clients must mask their frames, servers must not
+def encode_frame(opcode, payload, mask):
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    masking_key = os.urandom(4)
+    return bytes(header) + masking_key + _apply_mask(payload, masking_key)
+
+def _apply_mask(payload, masking_key):
+    # xor with the repeated 4 byte key, done as one big integer operation
+    repeated = (masking_key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+async def send_frame(writer, opcode, payload, mask=True):
+    writer.write(encode_frame(opcode, payload, mask))
+    await writer.drain()
+
+# =======================================================================
+# read one complete message, returns (opcode, payload bytes).
+# fragmented messages are reassembled, pings are answered, and a close frame
+# raises WebSocketClosed. a message over max_size is not read: the connection
+# is closed with 1009 and WebSocketClosed(1009) raised
+async def read_message(reader, writer, mask=True, max_size=MAX_MESSAGE_SIZE):
+    message_opcode = None
+    fragments = []
+    received = 0
+    while True:
+        first, second = await reader.readexactly(2)
+        fin = first & 0x80
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        received += length
+        if max_size is not None and received > max_size:
+            try:
+                await send_frame(writer, OP_CLOSE, struct.pack("!H", CLOSE_TOO_BIG), mask)
+            except ConnectionError:
+                pass
+            writer.close()
+            raise WebSocketClosed(CLOSE_TOO_BIG)
+        masking_key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if masking_key:
+            payload = _apply_mask(payload, masking_key)
+
+        if opcode == OP_PING:
+            await send_frame(writer, OP_PONG, payload, mask)
+            continue
+        if opcode == OP_PONG:
+            continue
+        if opcode == OP_CLOSE:
+            try:
+                await send_frame(writer, OP_CLOSE, payload[:2], mask)
+            except ConnectionError:
+                pass
+            raise WebSocketClosed(struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else None)
+
+        if opcode != OP_CONTINUATION:
+            message_opcode = opcode
+        if fin and not fragments:
+            return message_opcode, payload
+        fragments.append(payload)
+        if fin:
+            return message_opcode, b''.join(fragments)
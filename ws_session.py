@@ -0,0 +1,223 @@
+import asyncio
+import random
+import socket
+from collections import OrderedDict
+from http_client import get_client, HttpError
+import ws_protocol
+from ws_events import EventClient, ExecutingEvent, ExecutedEvent, ExecutionStartEvent, StatusEvent, history_events
+
+# errors that mean "the server is not reachable right now"
+CONNECT_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ws_protocol.WebSocketClosed)
+
+# =======================================================================
+# per prompt bookkeeping, to drop events the handlers have already seen
+class _PromptState:
+    def __init__(self):
+        self.started = False
+        self.cached = False
+        self.executing = set()  # node ids
+        self.executed = set()  # node ids
+        self.progress = {}  # node id -> last value
+
+# =======================================================================
+# an EventClient that survives connection drops.
+# when the connection is lost it reconnects with exponential backoff (plus
+# jitter) under the same clientId, so the server keeps sending that
+# client's prompt messages. events sent while it was away are lost, so
+# after a reconnect every in-flight prompt is reconciled: still in /queue
+# means it is still coming, found in /history/{prompt_id} means it finished
+# during the outage and its executed + executing(None) events are replayed
+# from the history entry (with data["recovered"] = True).
+# events are deduplicated per prompt, so handlers and follow() see every
+# start / executed / done exactly once, even when the server repeats the
+# current node after a reconnect. progress is only deduplicated within
+# replay_window seconds after a reconnect (a repeat of the last value of a
+# node), a node can legitimately run several progress passes.
+# connection handlers (on_connection) are awaited with (connected, error)
+# whenever the connection comes up or goes down, last_error keeps the error
+# prompts are in flight from track() (call it after submitting) or from
+# their first event, until they are done
+class Session(EventClient):
+    def __init__(self, server_address, client_id, timeout=10, backoff=0.5, max_backoff=30.0, history=1024,
+                 replay_window=5.0):
+        super().__init__(server_address, client_id, timeout)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.history = history
+        self.replay_window = replay_window
+        self.last_error = None
+        self._connection_handlers = []
+        self._replay_until = 0.0  # loop time until which repeated progress is a replay
+        self.reconnects = 0
+        self.duplicates = 0
+        self.recovered = 0
+        self.lost = []  # prompt_ids that vanished from both /queue and /history during an outage
+        self._prompts = {}  # prompt_id -> _PromptState, in flight
+        self._finished = OrderedDict()  # recently finished prompt_ids, to drop late duplicates
+        self._current = None  # running prompt, for progress messages without prompt_id
+        self._closing = False
+        self.connected = asyncio.Event()
+
+    # ===================================================================
+    def track(self, prompt_id):
+        if prompt_id not in self._finished:
+            self._prompts.setdefault(prompt_id, _PromptState())
+
+    @property
+    def in_flight(self):
+        return list(self._prompts)
+
+    def on_connection(self, handler):
+        self._connection_handlers.append(handler)
+        return handler
+
+    async def _connection_changed(self, connected, error=None):
+        if error is not None:
+            self.last_error = error
+        for handler in self._connection_handlers:
+            await handler(connected, error)
+
+    def _finish(self, prompt_id):
+        self._prompts.pop(prompt_id, None)
+        self._finished[prompt_id] = True
+        while len(self._finished) > self.history:
+            self._finished.popitem(last=False)
+        if self._current == prompt_id:
+            self._current = None
+
+    # True if handlers have already seen this event
+    def _duplicate(self, event):
+        if isinstance(event, StatusEvent):
+            return False
+        # progress messages of older servers have no prompt_id
+        prompt_id = event.prompt_id or self._current
+        if prompt_id is None:
+            return False
+        if prompt_id in self._finished:
+            return True
+        state = self._prompts.setdefault(prompt_id, _PromptState())
+
+        if isinstance(event, ExecutionStartEvent):
+            if state.started:
+                return True
+            state.started = True
+            self._current = prompt_id
+        elif event.type == "execution_cached":
+            if state.cached:
+                return True
+            state.cached = True
+        elif isinstance(event, ExecutingEvent):
+            if event.done:
+                self._finish(prompt_id)
+            elif event.node in state.executing:
+                return True
+            else:
+                state.executing.add(event.node)
+                self._current = prompt_id
+        elif isinstance(event, ExecutedEvent):
+            if event.node in state.executed:
+                return True
+            state.executed.add(event.node)
+        elif event.type == "progress":
+            node = event.data.get("node")
+            value = event.data.get("value")
+            replaying = asyncio.get_running_loop().time() < self._replay_until
+            if replaying and state.progress.get(node) == value:
+                return True
+            state.progress[node] = value
+        return False
+
+    async def dispatch(self, event):
+        if self._duplicate(event):
+            self.duplicates += 1
+            return
+        await super().dispatch(event)
+
+    # ===================================================================
+    async def connect(self):
+        await super().connect()
+        # notice dead connections (e.g. a NAT dropping the idle socket) on
+        # the TCP level, ComfyUI can be silent for a long time between prompts
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+    async def close(self):
+        self._closing = True
+        await super().close()
+
+    # receive and dispatch until close(), reconnecting whenever the connection
+    # drops (timeouts and any socket error included) with exponential backoff
+    async def run(self):
+        self._closing = False
+        attempt = 0
+        connected_before = False
+        while not self._closing:
+            if self._writer is None:
+                try:
+                    await self.connect()
+                except CONNECT_ERRORS as e:
+                    if attempt == 0:
+                        await self._connection_changed(False, e)
+                    await self._back_off(attempt)
+                    attempt += 1
+                    continue
+            attempt = 0
+            if connected_before:
+                self.reconnects += 1
+                self._replay_until = asyncio.get_running_loop().time() + self.replay_window
+                await self.reconcile()
+            connected_before = True
+            self.connected.set()
+            await self._connection_changed(True)
+            error = None
+            try:
+                await super().run()  # returns when the connection is gone
+            except CONNECT_ERRORS as e:
+                error = e  # from the socket read (handler errors stay in dispatch), e.g. ETIMEDOUT
+            self.connected.clear()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if not self._closing:
+                await self._connection_changed(False, error)
+                await self._back_off(0)
+                attempt = 1
+
+    async def _back_off(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    # ===================================================================
+    # catch up on prompts that progressed while we were disconnected
+    async def reconcile(self):
+        if not self._prompts:
+            return
+        loop = asyncio.get_running_loop()
+        http = get_client(self.server_address)
+        try:
+            queue = await loop.run_in_executor(None, http.get_json, '/queue')
+        except (OSError, HttpError):
+            return  # try again on the next reconnect
+        queued = {task[1] for task in queue.get("queue_running", []) + queue.get("queue_pending", [])}
+
+        for prompt_id in list(self._prompts):
+            if prompt_id in queued:
+                continue
+            try:
+                history = await loop.run_in_executor(None, http.get_json, f'/history/{prompt_id}')
+            except (OSError, HttpError):
+                continue
+            entry = history.get(prompt_id)
+            if entry is None:
+                # deleted or cleared while we were away, end it for followers anyway
+                self.lost.append(prompt_id)
+                await self.dispatch(ExecutingEvent({"node": None, "prompt_id": prompt_id, "recovered": True}))
+            else:
+                self.recovered += 1
+                for event in history_events(prompt_id, entry):
+                    await self.dispatch(event)